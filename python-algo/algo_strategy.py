@@ -3,7 +3,6 @@ import random
 import math
 import warnings
 from sys import maxsize
-import json
 import utils
 import strategies
 
@@ -16,9 +15,21 @@ Advanced strategy tips:
 
   - You can analyze action frames by modifying on_action_frame function
 
+  - If you only need some action frames, such as the ones with breaches, 
+  call subscribe_action_frames so the rest are skipped without being decoded
+
+  - Expensive work for the next turn can run during the action phase by 
+  overriding on_precompute and calling start_precompute after submit_turn
+
   - The GameState.map object can be manually manipulated to create hypothetical 
-  board states. Though, we recommended making a copy of the map to preserve 
-  the actual current map state.
+  board states. Though, we recommended making a copy of the state with 
+  GameState.fork() to preserve the actual current map state.
+
+  - Instead of hard-coded build lists, gamelib.Planner can search for the 
+  structures an evaluator such as gamelib.search.defense_evaluator scores best
+
+  - Calling self.start_worker_pool() in on_game_start lets self.map_candidates 
+  evaluate candidates, such as spawn locations, on every core
 """
 
 class AlgoStrategy(gamelib.AlgoCore):
@@ -145,41 +156,34 @@ class AlgoStrategy(gamelib.AlgoCore):
     def least_damage_spawn_location(self, game_state, location_options):
         """
         This function will help us guess which location is the safest to spawn moving units from.
-        It gets the path the unit will take then checks locations on that path to 
-        estimate the path's damage risk.
+        It estimates the damage our scouts would take along the path from each location, 
+        using the time they spend in range of each enemy turret.
         """
-        damages = []
-        # Get the damage estimate each path will take
-        for location in location_options:
-            path = game_state.find_path_to_edge(location)
-            if not path:
-                continue
-            
-            damage = 0
-            for path_location in path:
-                # Get number of enemy turrets that can attack each location and multiply by turret damage
-                damage += len(game_state.get_attackers(path_location, 0)) * gamelib.GameUnit(self.types.TURRET, game_state.config).damage_i
-            damages.append(damage)
-        
+        # Estimate the whole group we can afford, and prefer the most survivors, then the least exposed path,
+        # so locations are still told apart when every path is lethal.
+        # The estimator reuses one set of paths and one threat map for every location
+        num = max(1, game_state.number_affordable(self.types.SCOUT))
+        location, estimate = game_state.attack_estimator().best_location(location_options, self.types.SCOUT, num,
+            key=lambda estimate: (estimate.survivors, estimate.breaches, -estimate.exposure))
+
         # Now just return the location that takes the least damage
-        return location_options[damages.index(min(damages))] if damages else None
+        return location
 
     def detect_enemy_unit(self, game_state, unit_type=None, valid_x = None, valid_y = None):
-        total_units = 0
-        for location in game_state.game_map:
-            if game_state.contains_stationary_unit(location):
-                for unit in game_state.game_map[location]:
-                    if unit.player_index == 1 and (unit_type is None or unit.unit_type == unit_type) and (valid_x is None or location[0] in valid_x) and (valid_y is None or location[1] in valid_y):
-                        total_units += 1
-        return total_units
-
-    def on_action_frame(self, turn_string):
+        enemy_structures = gamelib.Bitboard.from_game_map(game_state.game_map, 1, unit_type, stationary=True)
+        if valid_x is not None:
+            enemy_structures &= gamelib.Bitboard.columns(valid_x)
+        if valid_y is not None:
+            enemy_structures &= gamelib.Bitboard.rows(valid_y)
+        return len(enemy_structures)
+
+    def on_action_frame(self, state):
         """
         This is the action frame of the game. This function could be called 
         hundreds of times per turn and could slow the algo down so avoid putting slow code here.
+        The frame is passed already decoded from json.
         Full doc on format of a game frame at: https://docs.c1games.com/json-docs.html
         """
-        state = json.loads(turn_string)
         events = state["events"]
         breaches = events["breach"]
         for breach in breaches:
@@ -16,6 +16,27 @@ Investigating it is useful for advanced players interested in getting data from
 The Navigation class in navigation.py contains functions related to pathfinding, which are used by GameState in pathing related functions. 
 Investigating it is useful for advanced player who want to optimize the slow default pathing algorithm we provide. \n 
 
+The ThreatMap class in threat_map.py summarizes how much damage every location would take from the opponent's units. 
+It is built by GameState.threat_map() and is useful for quickly scoring paths and spawn locations. \n
+
+The AttackEstimator class in attack_estimator.py estimates the survivors, breaches and structure damage of an attack from any spawn location. 
+It is built by GameState.attack_estimator() and is much faster than running a Simulator. \n
+
+The WorkerPool class in parallel.py evaluates many candidates at once across worker processes. 
+AlgoCore starts one with start_worker_pool() and uses it in map_candidates(). \n
+
+The Planner class in search.py searches for the build and deploy plan an evaluator scores best, with beam search or Monte Carlo tree search. 
+It tries plans on forks of the GameState and stops in time to return the best plan found. \n
+
+The Simulator class in simulator.py plays out the action phase locally, frame by frame, from a GameState. 
+It is useful for estimating what an attack will do before committing to it. \n
+
+The TimeBudget class in time_budget.py keeps track of the time left to submit a turn. 
+AlgoCore gives on_turn one as self.time_budget, which helps expensive strategies stop searching in time. \n
+
+The Bitboard class in bitboard.py stores a set of locations as the bits of an int. 
+It is useful for fast set-style questions about the board, such as which locations enemy turrets cover. \n
+
 util.py contains a small handful of functions that help with communication, including the debug-printing function, debug_write().
 """
 
@@ -24,6 +45,13 @@ from .util import debug_write
 from .game_state import GameState
 from .unit import GameUnit
 from .game_map import GameMap
-
-__all__ = ["algocore", "game_state", "game_map", "navigation", "unit", "util"]
+from .threat_map import ThreatMap
+from .attack_estimator import AttackEstimator
+from .parallel import WorkerPool
+from .search import Planner
+from .simulator import Simulator
+from .time_budget import TimeBudget
+from .bitboard import Bitboard
+
+__all__ = ["algocore", "attack_estimator", "bitboard", "game_state", "game_map", "navigation", "parallel", "search", "simulator", "threat_map", "time_budget", "unit", "util"]
  
\ No newline at end of file
@@ -1,7 +1,13 @@
 import json
+import re
+import threading
+import time
+import traceback
 
 from .game_state import GameState
-from .util import get_command, debug_write, BANNER_TEXT, send_command
+from .parallel import WorkerPool, evaluate_candidates
+from .time_budget import TimeBudget
+from .util import get_command, debug_write, read_turn_info, BANNER_TEXT, send_command
 
 class AlgoCore(object):
     """
@@ -10,10 +16,46 @@ class AlgoCore(object):
 
     Attributes :
         * config (JSON): json object containing information about the game
+        * time_budget (TimeBudget): The time left for the current turn, started when the turn message is read. None outside of on_turn,
+          including on the on_precompute thread
+        * worker_pool (WorkerPool): The worker processes started by start_worker_pool, None if there are none
 
     """
     def __init__(self):
         self.config = None
+        self.worker_pool = None
+        self._frame_subscription = None
+        self._precompute_thread = None
+        self._precompute_state = None
+        self._precompute_result = None
+        self.__reset_action_phase()
+
+    @property
+    def time_budget(self):
+        return TimeBudget.current
+
+    def subscribe_action_frames(self, first=False, last=False, events=None, every=None):
+        """Chooses which action frames are decoded and passed to on_action_frame, instead of every frame.
+        Frames that don't match are read and skipped without being decoded, which leaves more time for on_turn.
+        The events of matching frames are gathered into one summary per action phase, see on_action_summary.
+
+        Args:
+            first: If True, pass the first frame of each action phase
+            last: If True, pass the last frame of each action phase. It is only known to be the last one once the next turn arrives, 
+                so it is passed then, just before the summary and on_turn
+            events: A list of event types, such as ["breach", "death"]. Frames with at least one event of these types are passed
+            every: If set, pass every nth frame of each action phase, starting with the first
+
+        """
+        events = tuple(events) if events else ()
+        self._frame_subscription = {
+            "first": first,
+            "last": last,
+            "events": events,
+            "every": every,
+            # Spots a non empty list of events of the type without decoding the frame
+            "patterns": [re.compile(r'"{}"\s*:\s*\[\s*\['.format(re.escape(event))) for event in events]
+        }
 
     def on_game_start(self, config):
         """
@@ -26,7 +68,8 @@ class AlgoCore(object):
     def on_turn(self, game_state):
         """
         This step function is called at the start of each turn.
-        It is passed the current game state, which can be used to initiate a new GameState object. 
+        It is passed the current game state, already decoded from json into a dict, which can be used to initiate a new GameState object. 
+        self.time_budget tracks how much time is left to submit the turn. \n
         By default, it sends empty commands to the game engine. \n
         algo_strategy.py inherits from AlgoCore and overrides this on turn function. 
         Adjusting the on_turn function in algo_strategy is the main way to adjust your algo's logic. 
@@ -40,9 +83,177 @@ class AlgoCore(object):
         The action phase is made up of a sequence of distinct frames. 
         Each of these frames is sent to the algo in order. 
         They can be handled in this function. 
+        Each frame is passed already decoded from json into a dict.
+        Use subscribe_action_frames to only get the frames you need.
         """
         pass
 
+    def on_action_summary(self, summary):
+        """
+        Called once after each action phase, before the next on_turn, if subscribe_action_frames was used.
+        The summary is a dict with:
+            * "turn": The turn number of the action phase
+            * "frames": The number of frames the action phase had, including skipped ones
+            * "events": A dict from event type to the list of events of that type in the frames that were passed to on_action_frame. 
+              Only the subscribed event types are included, or every type if none were subscribed to.
+        """
+        pass
+
+    def on_precompute(self, predicted_state):
+        """
+        Runs on a background thread, started by start_precompute, while the action phase plays out. 
+        Override it to get a head start on the next turn, for example building threat maps or scoring candidate builds
+        on the board you expect the next turn to start with. Whatever it returns can be fetched in the next on_turn 
+        with get_precomputed. It must not use anything the main thread changes, such as the GameState of the current turn.
+        There is no time budget on this thread, so give searches a max_iterations or a TimeBudget of their own.
+        """
+        return None
+
+    def precompute_is_stale(self, predicted_state, game_state):
+        """
+        Checks if a result of on_precompute no longer applies to the game_state of a new turn. 
+        By default it is stale if the structures are not on the locations that were predicted. 
+        Override it to be more or less strict.
+
+        Args:
+            predicted_state: The GameState passed to start_precompute
+            game_state: The GameState of the new turn
+
+        Returns:
+            True if the result should be thrown away
+        """
+        return predicted_state.game_map.blocked != game_state.game_map.blocked
+
+    def start_precompute(self, predicted_state):
+        """Starts on_precompute on a background thread. Call it at the end of on_turn, after submitting the turn, 
+        so the work runs while the engine plays out the action phase and this thread handles action frames.
+
+        Args:
+            predicted_state: A GameState of the board you expect at the start of the next turn. 
+                on_precompute works on a fork of it, so it is safe to keep using it afterwards.
+
+        Returns:
+            True if the worker was started, False if the previous one is still running
+
+        """
+        if self._precompute_thread is not None and self._precompute_thread.is_alive():
+            debug_write("Previous precompute is still running, not starting another one")
+            return False
+        # Kept untouched for precompute_is_stale, while the worker gets its own fork to change
+        self._precompute_state = predicted_state.fork()
+        self._precompute_result = None
+        worker_state = predicted_state.fork(share_path_cache=False)
+        self._precompute_thread = threading.Thread(target=self.__run_precompute, args=(worker_state,), daemon=True)
+        self._precompute_thread.start()
+        return True
+
+    def get_precomputed(self, game_state, timeout=0):
+        """Gets what the last on_precompute returned, if it has finished and is not stale for game_state
+
+        Args:
+            game_state: The GameState of the current turn
+            timeout: The longest time in seconds to wait for on_precompute to finish
+
+        Returns:
+            The result of on_precompute, or None if it is still running, failed or is stale
+
+        """
+        thread = self._precompute_thread
+        if thread is None:
+            return None
+        thread.join(timeout)
+        if thread.is_alive():
+            return None
+        if self.precompute_is_stale(self._precompute_state, game_state):
+            return None
+        return self._precompute_result
+
+    def start_worker_pool(self, processes=None):
+        """Starts worker processes for map_candidates. Call it from on_game_start, after self.config is set,
+        so the workers are given the config once and are ready before the first turn.
+
+        Args:
+            processes: The number of worker processes, one per core if None
+
+        """
+        if self.worker_pool is None:
+            self.worker_pool = WorkerPool(self.config, processes)
+
+    def map_candidates(self, fn, candidates, game_state, timeout=None):
+        """Calls fn(fork, candidate) for every candidate, each on its own fork of game_state, and returns the results in order.
+        The candidates are spread over the worker processes if start_worker_pool was called, and evaluated here otherwise.
+        See WorkerPool.map_candidates.
+
+        Args:
+            fn: A function taking a GameState and a candidate, defined at the top level of a module
+            candidates: A list of candidates, such as spawn locations
+            game_state: The GameState to evaluate the candidates on
+            timeout: The longest time in seconds to wait. The time left before the soft limit of the turn if None
+
+        Returns:
+            A list with fn's result for each candidate, None for candidates that failed or didn't finish in time
+
+        """
+        if self.worker_pool is not None:
+            return self.worker_pool.map_candidates(fn, candidates, game_state, timeout)
+        budget = self.time_budget
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        return evaluate_candidates(fn, list(candidates), game_state, lambda: (deadline is not None and time.perf_counter() > deadline) or
+            (deadline is None and budget is not None and budget.should_stop()))
+
+    def __run_precompute(self, predicted_state):
+        try:
+            self._precompute_result = self.on_precompute(predicted_state)
+        except Exception:
+            debug_write("on_precompute failed:\n{}".format(traceback.format_exc()))
+
+    def __play_turn(self, game_state_string, received):
+        budget = TimeBudget(self.config if self.config is not None else {}, received)
+        # Only set for the thread playing the turn
+        TimeBudget.current = budget
+        budget.start_watchdog()
+        try:
+            self.on_turn(json.loads(game_state_string))
+        finally:
+            budget.stop()
+            TimeBudget.current = None
+
+    def __reset_action_phase(self):
+        self._frame_count = 0
+        self._frame_turn = None
+        self._last_frame = None
+        self._last_frame_passed = False
+        self._frame_events = {}
+
+    def __on_subscribed_frame(self, message, turn_info):
+        subscription = self._frame_subscription
+        index = self._frame_count
+        self._frame_count += 1
+        self._frame_turn = turn_info[1]
+        self._last_frame = message
+        every = subscription["every"]
+        matched = ((subscription["first"] and index == 0) or (every and index % every == 0) or
+                   any(pattern.search(message) for pattern in subscription["patterns"]))
+        self._last_frame_passed = bool(matched)
+        if matched:
+            self.__pass_frame(json.loads(message))
+
+    def __pass_frame(self, state):
+        wanted = self._frame_subscription["events"]
+        for event_type, events in state.get("events", {}).items():
+            if events and (not wanted or event_type in wanted):
+                self._frame_events.setdefault(event_type, []).extend(events)
+        self.on_action_frame(state)
+
+    def __finish_action_phase(self):
+        if self._frame_subscription is None or self._frame_count == 0:
+            return
+        if self._frame_subscription["last"] and not self._last_frame_passed:
+            self.__pass_frame(json.loads(self._last_frame))
+        summary = {"turn": self._frame_turn, "frames": self._frame_count, "events": self._frame_events}
+        self.__reset_action_phase()
+        self.on_action_summary(summary)
+
 
     def start(self):
         """ 
@@ -57,31 +268,41 @@ class AlgoCore(object):
             # Note: Python blocks and hangs on stdin. Can cause issues if connections aren't setup properly and may need to
             # manually kill this Python program.
             game_state_string = get_command()
-            if "replaySave" in game_state_string:
+            received = time.perf_counter()
+            # Only the short turnInfo list is read to classify the message, so each message is decoded from json once at most
+            turn_info = read_turn_info(game_state_string)
+            if turn_info is None and "replaySave" in game_state_string:
                 """
                 This means this must be the config file. So, load in the config file as a json and add it to your AlgoStrategy class.
                 """
                 parsed_config = json.loads(game_state_string)
                 self.on_game_start(parsed_config)
-            elif "turnInfo" in game_state_string:
-                state = json.loads(game_state_string)
-                stateType = int(state.get("turnInfo")[0])
+            elif turn_info is not None:
+                stateType = int(turn_info[0])
+                if stateType != 1:
+                    self.__finish_action_phase()
                 if stateType == 0:
                     """
                     This is the game turn game state message. Algo must now print to stdout 2 lines, one for build phase one for
                     deploy phase. Printing is handled by the provided functions.
                     """
-                    self.on_turn(game_state_string)
+                    self.__play_turn(game_state_string, received)
                 elif stateType == 1:
                     """
                     If stateType == 1, this game_state_string string represents a single frame of an action phase
                     """
-                    self.on_action_frame(game_state_string)
+                    if self._frame_subscription is None:
+                        self.on_action_frame(json.loads(game_state_string))
+                    else:
+                        self.__on_subscribed_frame(game_state_string, turn_info)
                 elif stateType == 2:
                     """
                     This is the end game message. This means the game is over so break and finish the program.
                     """
                     debug_write("Got end state, game over. Stopping algo.")
+                    if self.worker_pool is not None:
+                        self.worker_pool.close()
+                        self.worker_pool = None
                     break
                 else:
                     """
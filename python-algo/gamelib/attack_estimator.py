@@ -0,0 +1,204 @@
+import math
+
+from .bitboard import Bitboard
+from .game_map import ARENA_SIZE, IN_ARENA, range_offsets
+from .unit import unit_stats
+
+
+class AttackEstimate:
+    """The estimated outcome of sending a group of mobile units from one location
+
+    Attributes :
+        * survivors (int): The number of units still alive when the group breaches or self destructs
+        * breaches (int): The number of units that reach their edge
+        * structure_damage (float): The damage the group deals to enemy structures, including self destructs
+        * damage_taken (float): The damage the group takes along its path, at most the health of the whole group
+        * exposure (float): The damage the path deals if no unit dies, so lethal paths can still be compared
+        * frames (float): The number of frames the group spends on the board
+        * path (tuple): The location indices of the path, see GameState.find_paths(..., as_indices=True)
+
+    """
+    __slots__ = ("survivors", "breaches", "structure_damage", "damage_taken", "exposure", "frames", "path")
+
+    def __init__(self, survivors, breaches, structure_damage, damage_taken, exposure, frames, path):
+        self.survivors = survivors
+        self.breaches = breaches
+        self.structure_damage = structure_damage
+        self.damage_taken = damage_taken
+        self.exposure = exposure
+        self.frames = frames
+        self.path = path
+
+    def __repr__(self):
+        return "AttackEstimate(survivors={}, breaches={}, structure_damage={}, damage_taken={})".format(
+            self.survivors, self.breaches, self.structure_damage, self.damage_taken)
+
+
+class _PathProfile:
+    # What a unit type meets along the path from one location, shared by every group size
+    __slots__ = ("path", "frames_per_location", "threat", "exposure", "structures_in_range", "shields", "breach", "self_destruct_targets")
+
+
+class AttackEstimator:
+    """Estimates what a group of mobile units would do, much faster than a Simulator.
+
+    The group's path and the damage per frame at every location come from the GameState's cached paths and ThreatMap.
+    At each location the group takes that damage for the frames it spends there (1 / speed), focused on one unit at a time
+    like turrets do, gains shields from friendly supports it passes, and attacks enemy structures in range.
+    Enemy mobile units are not taken into account. What each unit type meets along each path is worked out once,
+    so estimating another group size or unit type at a known location only walks the path.
+
+    Get one from GameState.attack_estimator, which keeps it until units are added to or removed from the map.
+
+    Attributes :
+        * player_index (int): The player sending the units, 0 for you 1 for the enemy
+
+    """
+    def __init__(self, game_state, player_index=0):
+        """Reads the threat map and the structures of both players
+
+        Args:
+            game_state: The GameState to estimate attacks on
+            player_index: The player sending the units, 0 for you 1 for the enemy
+
+        """
+        self.player_index = player_index
+        self.__game_state = game_state
+        self.__config = game_state.config
+        self.__get_hit_radius = game_state.config["unitInformation"][0]["getHitRadius"]
+        self.__threat = game_state.threat_map(player_index).flat_damage()
+        self.__structures = Bitboard.from_game_map(game_state.game_map, 1 - player_index, stationary=True)
+        self.__structure_health = sum(unit.health for unit in game_state.game_map.iter_units(player_index=1 - player_index, stationary=True))
+        self.__ranges = {}
+        self.__profiles = {}
+
+        # Location index -> the supports whose shields reach it
+        self.__shields = {}
+        for support in game_state.game_map.iter_units(player_index=player_index, stationary=True):
+            if support.shieldRange <= 0 or support.shieldPerUnit <= 0:
+                continue
+            for index in self.__area([support.x, support.y], support.shieldRange):
+                self.__shields.setdefault(index, []).append((id(support), support.shieldPerUnit))
+
+    def estimate(self, location, unit_type, num=1):
+        """Estimates the outcome of spawning num units of unit_type at location
+
+        Args:
+            location: The spawn location
+            unit_type: A mobile unit type
+            num: The number of units spawned
+
+        Returns:
+            An AttackEstimate, or None if there is no path from location
+
+        """
+        profile = self.__profile(location, unit_type)
+        if profile is None:
+            return None
+        stats = unit_stats(self.__config, unit_type)
+        unit_health = stats.max_health
+        pool = unit_health * num
+        alive = num
+        damage_taken = 0
+        structure_damage = 0
+        frames = profile.frames_per_location
+        for threat, in_range, shield in zip(profile.threat, profile.structures_in_range, profile.shields):
+            if shield:
+                unit_health += shield
+                pool += shield * alive
+            if in_range:
+                structure_damage += stats.damage_f * alive * frames
+            taken = min(threat * frames, pool)
+            damage_taken += taken
+            pool -= taken
+            if pool <= 0:
+                alive = 0
+                break
+            # Turrets focus one unit at a time, so only the damaged unit can be partially hurt
+            alive = math.ceil(pool / unit_health - 1e-9)
+
+        breaches = alive if profile.breach else 0
+        if not profile.breach and alive:
+            type_config = self.__config["unitInformation"][stats.type_index]
+            structure_damage += alive * profile.self_destruct_targets * type_config.get("selfDestructDamageTower", 0)
+        structure_damage = min(structure_damage, self.__structure_health)
+        return AttackEstimate(alive, breaches, structure_damage, damage_taken, profile.exposure, frames * len(profile.threat), profile.path)
+
+    def best_location(self, locations, unit_type, num=1, key=None):
+        """Estimates an attack from every location and picks the best one
+
+        Args:
+            locations: A list of spawn locations
+            unit_type: A mobile unit type
+            num: The number of units spawned
+            key: A function taking an AttackEstimate and returning a score to maximize.
+                By default, most breaches, then most structure damage, then least damage taken
+
+        Returns:
+            The best location and its AttackEstimate, or (None, None) if no location has a path
+
+        """
+        if key is None:
+            key = lambda estimate: (estimate.breaches, estimate.structure_damage, -estimate.damage_taken)
+        best = (None, None)
+        best_score = None
+        for location in locations:
+            estimate = self.estimate(location, unit_type, num)
+            if estimate is None:
+                continue
+            score = key(estimate)
+            if best_score is None or score > best_score:
+                best, best_score = (location, estimate), score
+        return best
+
+    def __profile(self, location, unit_type):
+        cache_key = (location[0], location[1], unit_type)
+        if cache_key in self.__profiles:
+            return self.__profiles[cache_key]
+        game_state = self.__game_state
+        result = None
+        if game_state.game_map.in_arena_bounds(location) and not game_state.contains_stationary_unit(location):
+            result = game_state.find_path_results([location], as_indices=True)[0]
+        if result is None:
+            self.__profiles[cache_key] = None
+            return None
+        path = result.path
+        stats = unit_stats(self.__config, unit_type)
+        type_config = self.__config["unitInformation"][stats.type_index]
+        profile = _PathProfile()
+        profile.path = path
+        profile.frames_per_location = 1 / stats.speed if stats.speed > 0 else 1
+        profile.breach = result.reached_edge
+        # A breaching unit leaves as soon as it reaches its edge, a self destructing one waits on its last location
+        visited = path[:-1] if profile.breach else path
+        profile.threat = [self.__threat[index] for index in visited]
+        profile.exposure = sum(profile.threat) * profile.frames_per_location
+        reach = self.__range_mask(stats.attackRange) if stats.damage_f > 0 else 0
+        profile.structures_in_range = [(reach >> index) & 1 for index in visited]
+        profile.shields = []
+        shielded_by = set()
+        for index in visited:
+            gain = 0
+            for support, shield in self.__shields.get(index, ()):
+                if support not in shielded_by:
+                    shielded_by.add(support)
+                    gain += shield
+            profile.shields.append(gain)
+        profile.self_destruct_targets = 0
+        if not profile.breach and result.steps >= type_config.get("selfDestructStepsRequired", 0):
+            profile.self_destruct_targets = sum(1 for index in self.__area(result.self_destruct_tile, type_config.get("selfDestructRange", 0))
+                if index in self.__structures)
+        self.__profiles[cache_key] = profile
+        return profile
+
+    def __range_mask(self, radius):
+        # The locations from which a unit with this range can attack an enemy structure
+        mask = self.__ranges.get(radius)
+        if mask is None:
+            mask = self.__ranges[radius] = self.__structures.dilate(radius, self.__get_hit_radius).bits
+        return mask
+
+    def __area(self, location, radius):
+        x, y = location
+        return [(x + i) * ARENA_SIZE + y + j for i, j in range_offsets(radius, self.__get_hit_radius)
+            if 0 <= x + i < ARENA_SIZE and 0 <= y + j < ARENA_SIZE and IN_ARENA[(x + i) * ARENA_SIZE + y + j]]
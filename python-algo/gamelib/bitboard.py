@@ -0,0 +1,204 @@
+from .game_map import ARENA_SIZE, IN_ARENA, EDGE_INDICES, range_offsets
+from .unit import unit_stats
+
+ARENA_CELLS = ARENA_SIZE * ARENA_SIZE
+
+# Turns a bytearray of 0s and 1s into the characters of a binary number
+_BINARY_DIGITS = bytes.maketrans(b"\x00\x01", b"01")
+
+
+def _mask_from_flags(flags):
+    """The int with bit i set wherever flags[i] is 1, for a bytes-like object of 0s and 1s"""
+    return int(bytes(flags).translate(_BINARY_DIGITS)[::-1], 2)
+
+
+def _mask_from_indices(indices):
+    bits = 0
+    for index in indices:
+        bits |= 1 << index
+    return bits
+
+
+_ARENA_MASK = _mask_from_flags(IN_ARENA)
+# _ROW_MASKS[y] has a bit set for every location with that y, inside the arena or not
+_ROW_MASKS = tuple(_mask_from_indices(x * ARENA_SIZE + y for x in range(ARENA_SIZE)) for y in range(ARENA_SIZE))
+_COLUMN_MASKS = tuple(((1 << ARENA_SIZE) - 1) << (x * ARENA_SIZE) for x in range(ARENA_SIZE))
+_EDGE_MASKS = tuple(_mask_from_indices(edge) for edge in EDGE_INDICES)
+
+_shift_masks = {}
+
+
+def _shift_mask(dy):
+    """The locations that stay in their column when moved by dy"""
+    mask = _shift_masks.get(dy)
+    if mask is None:
+        mask = 0
+        for y in range(ARENA_SIZE):
+            if 0 <= y + dy < ARENA_SIZE:
+                mask |= _ROW_MASKS[y]
+        _shift_masks[dy] = mask
+    return mask
+
+
+class Bitboard:
+    """A set of arena locations, stored as the bits of a single int. Location [x, y] is bit x * ARENA_SIZE + y.
+    Set operations on whole boards (|, &, ^, -, ~) are a handful of big int operations,
+    which makes them much faster than looping over the GameMap.
+
+    Iterating over a Bitboard yields its locations as [x, y] lists, ordered by x then y.
+
+    Attributes :
+        * bits (int): The locations in the set
+
+    """
+    __slots__ = ("bits",)
+
+    def __init__(self, bits=0):
+        self.bits = bits
+
+    @classmethod
+    def arena(cls):
+        """Every location inside the diamond shaped board"""
+        return cls(_ARENA_MASK)
+
+    @classmethod
+    def edge(cls, edge):
+        """The locations along an edge, game_map.TOP_RIGHT, game_map.BOTTOM_LEFT, etc."""
+        return cls(_EDGE_MASKS[edge])
+
+    @classmethod
+    def rows(cls, ys):
+        """The arena locations whose y is one of ys. Values outside the board are skipped"""
+        bits = 0
+        for y in ys:
+            if 0 <= y < ARENA_SIZE:
+                bits |= _ROW_MASKS[y]
+        return cls(bits & _ARENA_MASK)
+
+    @classmethod
+    def columns(cls, xs):
+        """The arena locations whose x is one of xs. Values outside the board are skipped"""
+        bits = 0
+        for x in xs:
+            if 0 <= x < ARENA_SIZE:
+                bits |= _COLUMN_MASKS[x]
+        return cls(bits & _ARENA_MASK)
+
+    @classmethod
+    def from_locations(cls, locations):
+        """Makes a Bitboard from a list of locations,
+        or a tuple of location indices as returned by GameState.find_paths(..., as_indices=True)
+        """
+        bits = 0
+        for location in locations:
+            if type(location) is int:
+                bits |= 1 << location
+            else:
+                bits |= 1 << (location[0] * ARENA_SIZE + location[1])
+        return cls(bits)
+
+    @classmethod
+    def from_game_map(cls, game_map, player_index=None, unit_type=None, stationary=None):
+        """Makes a Bitboard of the locations holding matching units
+
+        Args:
+            game_map: The GameMap to read units from
+            player_index: Only count units of this player, 0 for you 1 for the enemy. Any player if None
+            unit_type: Only count units of this type. Any type if None
+            stationary: If True only count structures, if False only mobile units. Both if None
+
+        Returns:
+            A Bitboard with every location holding at least one matching unit
+
+        """
+        if stationary and player_index is None and unit_type is None:
+            return cls(_mask_from_flags(game_map.blocked))
+
+        table = game_map.get_unit_table()
+        type_index = None if unit_type is None else unit_stats(game_map.config, unit_type).type_index
+        if stationary is not None:
+            stationary_types = set(stats.type_index for stats in _all_stats(game_map.config) if stats.stationary == stationary)
+        bits = 0
+        for unit_type_index, owner, x, y in zip(table.unit_type, table.player_index, table.x, table.y):
+            if player_index is not None and owner != player_index:
+                continue
+            if type_index is not None and unit_type_index != type_index:
+                continue
+            if stationary is not None and unit_type_index not in stationary_types:
+                continue
+            bits |= 1 << (int(x) * ARENA_SIZE + int(y))
+        return cls(bits)
+
+    def to_locations(self):
+        """The locations in the set as a list of [x, y] lists"""
+        return list(self)
+
+    def shift(self, dx, dy):
+        """Moves every location by [dx, dy], dropping the ones that leave the arena"""
+        bits = self.bits & _shift_mask(dy)
+        offset = dx * ARENA_SIZE + dy
+        bits = bits << offset if offset >= 0 else bits >> -offset
+        return Bitboard(bits & _ARENA_MASK)
+
+    def dilate(self, radius, get_hit_radius=0):
+        """Every arena location within radius of a location in the set, the area get_locations_in_range covers around each of them.
+        For example, the locations a set of turrets can attack is turrets.dilate(turret_range, get_hit_radius)
+        """
+        bits = 0
+        for i, j in range_offsets(radius, get_hit_radius):
+            bits |= self.shift(i, j).bits
+        return Bitboard(bits)
+
+    def __contains__(self, location):
+        index = location if type(location) is int else location[0] * ARENA_SIZE + location[1]
+        return index >= 0 and (self.bits >> index) & 1 == 1
+
+    def __iter__(self):
+        bits = self.bits
+        while bits:
+            low = bits & -bits
+            index = low.bit_length() - 1
+            yield [index // ARENA_SIZE, index % ARENA_SIZE]
+            bits ^= low
+
+    def __len__(self):
+        return _popcount(self.bits)
+
+    def __bool__(self):
+        return self.bits != 0
+
+    def __or__(self, other):
+        return Bitboard(self.bits | other.bits)
+
+    def __and__(self, other):
+        return Bitboard(self.bits & other.bits)
+
+    def __xor__(self, other):
+        return Bitboard(self.bits ^ other.bits)
+
+    def __sub__(self, other):
+        return Bitboard(self.bits & ~other.bits)
+
+    def __invert__(self):
+        return Bitboard(~self.bits & _ARENA_MASK)
+
+    def __eq__(self, other):
+        return isinstance(other, Bitboard) and self.bits == other.bits
+
+    def __hash__(self):
+        return hash(self.bits)
+
+    def __repr__(self):
+        return "Bitboard({})".format(self.to_locations())
+
+
+if hasattr(int, "bit_count"):
+    def _popcount(bits):
+        return bits.bit_count()
+else:
+    def _popcount(bits):
+        return bin(bits).count("1")
+
+
+def _all_stats(config):
+    return [unit_stats(config, info["shorthand"]) for info in config["unitInformation"] if "shorthand" in info and "unitCategory" in info]
@@ -1,7 +1,158 @@
+import array
+import copy
 import math
 from .unit import GameUnit
 from .util import debug_write
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+"""
+The shape of the arena never changes, so the bounds, the edges and the offsets covered by 
+each attack range are computed once here and shared by every GameMap.
+"""
+ARENA_SIZE = 28
+HALF_ARENA = ARENA_SIZE // 2
+
+
+def _build_bounds():
+    bounds = bytearray(ARENA_SIZE * ARENA_SIZE)
+    for y in range(ARENA_SIZE):
+        row_size = y + 1 if y < HALF_ARENA else ARENA_SIZE - y
+        for x in range(HALF_ARENA - row_size, HALF_ARENA + row_size):
+            bounds[x * ARENA_SIZE + y] = 1
+    return bounds
+
+
+def _build_edges():
+    top_right = tuple((HALF_ARENA + num, ARENA_SIZE - 1 - num) for num in range(HALF_ARENA))
+    top_left = tuple((HALF_ARENA - 1 - num, ARENA_SIZE - 1 - num) for num in range(HALF_ARENA))
+    bottom_left = tuple((HALF_ARENA - 1 - num, num) for num in range(HALF_ARENA))
+    bottom_right = tuple((HALF_ARENA + num, num) for num in range(HALF_ARENA))
+    return (top_right, top_left, bottom_left, bottom_right)
+
+
+# 1 at index x * ARENA_SIZE + y for every location inside the diamond shaped board
+IN_ARENA = _build_bounds()
+# The (x, y) locations along each edge, indexed like GameMap.TOP_RIGHT, GameMap.TOP_LEFT, etc.
+EDGE_LOCATIONS = _build_edges()
+# The x * ARENA_SIZE + y indices of the locations along each edge
+EDGE_INDICES = tuple(frozenset(x * ARENA_SIZE + y for x, y in edge) for edge in EDGE_LOCATIONS)
+
+
+def _build_locations():
+    locations = tuple((x, y) for y in range(ARENA_SIZE) for x in range(ARENA_SIZE) if IN_ARENA[x * ARENA_SIZE + y])
+    half = len(locations) // 2
+    halves = (locations[:half], locations[half:])
+    quadrants = (
+        tuple((x, y) for x, y in halves[1] if x >= HALF_ARENA),
+        tuple((x, y) for x, y in halves[1] if x < HALF_ARENA),
+        tuple((x, y) for x, y in halves[0] if x < HALF_ARENA),
+        tuple((x, y) for x, y in halves[0] if x >= HALF_ARENA))
+    return locations, halves, quadrants
+
+
+# The (x, y) locations of the arena in the order GameMap iterates over them, row by row from the bottom.
+# HALF_LOCATIONS is indexed by player, 0 for the bottom half, and QUADRANT_LOCATIONS like the edges each quadrant touches.
+ARENA_LOCATIONS, HALF_LOCATIONS, QUADRANT_LOCATIONS = _build_locations()
+# The position of each x * ARENA_SIZE + y index in ARENA_LOCATIONS
+_ITERATION_ORDER = [0] * (ARENA_SIZE * ARENA_SIZE)
+for _position, (_x, _y) in enumerate(ARENA_LOCATIONS):
+    _ITERATION_ORDER[_x * ARENA_SIZE + _y] = _position
+
+_range_offsets = {}
+
+
+def range_offsets(radius, get_hit_radius):
+    """The (dx, dy) offsets of every location within radius of a location, 
+    in the order get_locations_in_range returns them. Cached per radius.
+
+    Args:
+        radius: The radius of the search area
+        get_hit_radius: The getHitRadius of the units in the game config
+
+    Returns:
+        A tuple of (dx, dy) offsets
+
+    """
+    key = (radius, get_hit_radius)
+    offsets = _range_offsets.get(key)
+    if offsets is None:
+        search_radius = math.ceil(radius)
+        offsets = tuple((i, j) for i in range(-search_radius, search_radius + 1) for j in range(-search_radius, search_radius + 1)
+            if math.sqrt(i ** 2 + j ** 2) < radius + get_hit_radius)
+        _range_offsets[key] = offsets
+    return offsets
+
+
+class UnitTable:
+    """Every unit on a GameMap stored as one array per attribute (struct of arrays), in location index order.
+    Useful for vectorized queries over all units. The arrays are numpy arrays when numpy is installed, array.array otherwise.
+
+    Attributes :
+        * unit_type (array): The index of each unit's type in config["unitInformation"]
+        * player_index (array): The player controlling each unit
+        * x (array): The x coordinate of each unit
+        * y (array): The y coordinate of each unit
+        * health (array): The current health of each unit
+        * upgraded (array): 1 for each upgraded unit, 0 otherwise
+
+    """
+    def __init__(self, units):
+        """Fills in the arrays
+
+        Args:
+            units: An iterable of GameUnits
+
+        """
+        unit_type = array.array("b")
+        player_index = array.array("b")
+        x = array.array("b")
+        y = array.array("b")
+        health = array.array("d")
+        upgraded = array.array("b")
+        for unit in units:
+            unit_type.append(unit.stats.type_index)
+            player_index.append(unit.player_index)
+            x.append(unit.x)
+            y.append(unit.y)
+            health.append(unit.health)
+            upgraded.append(unit.upgraded)
+        if np is not None:
+            unit_type, player_index, x, y, health, upgraded = (np.frombuffer(values, dtype=values.typecode) if len(values) else np.zeros(0, dtype=values.typecode)
+                for values in (unit_type, player_index, x, y, health, upgraded))
+        self.unit_type = unit_type
+        self.player_index = player_index
+        self.x = x
+        self.y = y
+        self.health = health
+        self.upgraded = upgraded
+
+    def __len__(self):
+        return len(self.unit_type)
+
+
+class _UnitBucket:
+    """The count, total health, total cost and locations of the units of one (player_index, unit_type) pair"""
+    __slots__ = ("locations", "count", "health", "cost")
+
+    def __init__(self):
+        self.locations = {}
+        self.count = 0
+        self.health = 0
+        self.cost = [0, 0]
+
+    def copy(self):
+        bucket = _UnitBucket()
+        bucket.locations = dict(self.locations)
+        bucket.count = self.count
+        bucket.health = self.health
+        bucket.cost = list(self.cost)
+        return bucket
+
+
 class GameMap:
     """Holds data about the current game map and provides functions
     useful for getting information related to the map.
@@ -18,6 +169,14 @@ class GameMap:
         * TOP_LEFT (int): A constant that represents the top left edge
         * BOTTOM_LEFT (int): Hidden challenge! Can you guess what this constant represents???
         * BOTTOM_RIGHT (int): A constant that represents the bottom right edge
+        * version (int): Increases every time units are added to, removed from or handed out for changing by GameMap functions. 
+          Cached results such as paths are tied to it, so edit the map through these functions rather than changing the lists in place.
+        * blocked (bytearray): 1 at index x * ARENA_SIZE + y for every location holding a structure, 0 elsewhere.
+          Kept up to date by the GameMap functions, treat it as read only. Locations handed out by get_writable_units 
+          are checked again the next time it is read, so structures added to or removed from those lists are picked up.
+
+    Maps created by fork() share their unit lists and units with the map they were forked from until one of them changes a location.
+    Change units through the GameMap and GameState functions, or get_writable_units, so the change stays in the map it was made on.
 
     """
     def __init__(self, config):
@@ -29,15 +188,32 @@ class GameMap:
         """
         self.config = config
         self.enable_warnings = True
-        self.ARENA_SIZE = 28
-        self.HALF_ARENA = int(self.ARENA_SIZE / 2)
+        self.ARENA_SIZE = ARENA_SIZE
+        self.HALF_ARENA = HALF_ARENA
         self.TOP_RIGHT = 0
         self.TOP_LEFT = 1
         self.BOTTOM_LEFT = 2
         self.BOTTOM_RIGHT = 3
         self.__map = self.__empty_grid()
-        self.__start = [13,0]
+        # The x * ARENA_SIZE + y index of every location that may hold units
+        self.__occupied = set()
+        # Units indexed by (player_index, unit_type), with the entries each location added so they can be taken out again
+        self.__buckets = {}
+        self.__cell_entries = {}
+        self.__buckets_owned = True
+        # Locations handed out by get_writable_units, indexed again before the next query
+        self.__dirty = set()
+        self.version = 0
+        self.__blocked = bytearray(self.ARENA_SIZE * self.ARENA_SIZE)
+        self.__unit_table = None
+        # 1 for every location whose unit list and units belong to this map alone, 0 if they may be shared with a fork
+        self.__owned = bytearray(b"\x01") * (self.ARENA_SIZE * self.ARENA_SIZE)
     
+    @property
+    def blocked(self):
+        self.__refresh_dirty()
+        return self.__blocked
+
     def __getitem__(self, location):
         if len(location) == 2 and self.in_arena_bounds(location):
             x,y = location
@@ -47,25 +223,222 @@ class GameMap:
     def __setitem__(self, location, val):
         if type(location) == tuple and len(location) == 2 and self.in_arena_bounds(location):
             self.__map[location[0]][location[1]] = val
+            self.__owned[location[0] * self.ARENA_SIZE + location[1]] = 1
+            self.__occupied.add(location[0] * self.ARENA_SIZE + location[1])
+            self.__index_location(location[0] * self.ARENA_SIZE + location[1])
+            self.__blocked[location[0] * self.ARENA_SIZE + location[1]] = any(unit.stationary for unit in val)
+            self.version += 1
             return
         self._invalid_coordinates(location)
 
     def __iter__(self):
-        self.__start = [13,0]
-        return self
-    
-    def __next__(self):
-        location = self.__start
-        if location == [15,27]:
-            raise StopIteration
-        new_location = [location[0]+1, location[1]]
-        while not self.in_arena_bounds(new_location) and not location == [14,27]:
-            if new_location[0] == self.ARENA_SIZE:
-                new_location = [0, new_location[1]+1]
+        for x, y in ARENA_LOCATIONS:
+            yield [x, y]
+
+    def get_locations(self, player_index=None, quadrant=None):
+        """Gets the locations of the arena, or part of it, in the order the map iterates over them.
+
+        Args:
+            player_index: If given, only the locations on this player's half, 0 for the bottom half 1 for the top half
+            quadrant: If given, only the locations in the quadrant touching this edge. game_map.TOP_LEFT, game_map.BOTTOM_RIGHT, etc.
+
+        Returns:
+            A tuple of (x, y) tuples, shared between all maps so do not change it
+
+        """
+        if quadrant is not None:
+            return QUADRANT_LOCATIONS[quadrant]
+        if player_index is not None:
+            return HALF_LOCATIONS[player_index]
+        return ARENA_LOCATIONS
+
+    def iter_units(self, player_index=None, unit_types=None, stationary=None):
+        """Iterates over the units on the map, visiting only the locations that hold units.
+        Units are visited in the same location order as iterating over the map.
+
+        Args:
+            player_index: Only visit units of this player, 0 for you 1 for the enemy. Any player if None
+            unit_types: Only visit units of these types. Any type if None
+            stationary: If True only visit structures, if False only mobile units. Both if None
+
+        Yields:
+            GameUnits
+
+        """
+        for index in sorted(self.__occupied, key=_ITERATION_ORDER.__getitem__):
+            for unit in self.__map[index // ARENA_SIZE][index % ARENA_SIZE]:
+                if player_index is not None and unit.player_index != player_index:
+                    continue
+                if unit_types is not None and unit.unit_type not in unit_types:
+                    continue
+                if stationary is not None and unit.stationary != stationary:
+                    continue
+                yield unit
+
+    def fork(self):
+        """Makes a copy of the map that can be changed without changing this one.
+        Only the grid is copied, the unit lists and units are shared until either map changes a location,
+        so forking is much cheaper than copy.deepcopy.
+
+        Returns:
+            A new GameMap with the same units as this one
+
+        """
+        child = object.__new__(GameMap)
+        child.__dict__.update(self.__dict__)
+        child.__map = [column[:] for column in self.__map]
+        child.__blocked = bytearray(self.__blocked)
+        child.__occupied = set(self.__occupied)
+        child.__dirty = set(self.__dirty)
+        # The indexes are copied by whichever map changes them first
+        self.__buckets_owned = False
+        child.__buckets_owned = False
+        # Every location is now shared, so both maps copy a location before changing it
+        self.__owned = bytearray(self.ARENA_SIZE * self.ARENA_SIZE)
+        child.__owned = bytearray(self.ARENA_SIZE * self.ARENA_SIZE)
+        return child
+
+    def get_writable_units(self, location):
+        """Gets the list of units at a location, for changing the units in place.
+        If the location is shared with a forked map, its list and units are copied first.
+
+        Args:
+            location: A map location
+
+        Returns:
+            The list of GameUnits at the location, which only this map uses
+
+        """
+        if not self.in_arena_bounds(location):
+            self._invalid_coordinates(location)
+            return
+        x, y = location
+        self.version += 1
+        self.__occupied.add(x * self.ARENA_SIZE + y)
+        self.__dirty.add(x * self.ARENA_SIZE + y)
+        return self.__own(x, y)
+
+    def get_unit_table(self):
+        """Gets every unit on the map as a UnitTable. 
+        The table is built on first use and reused until the map changes.
+
+        Returns:
+            A UnitTable of the units on the map
+
+        """
+        if self.__unit_table is None or self.__unit_table[0] != self.version:
+            units = (unit for index in sorted(self.__occupied) for unit in self.__map[index // ARENA_SIZE][index % ARENA_SIZE])
+            self.__unit_table = (self.version, UnitTable(units))
+        return self.__unit_table[1]
+
+    def __own(self, x, y):
+        index = x * self.ARENA_SIZE + y
+        if not self.__owned[index]:
+            self.__map[x][y] = [copy.copy(unit) for unit in self.__map[x][y]]
+            self.__owned[index] = 1
+        return self.__map[x][y]
+
+    def get_units_of(self, player_index=None, unit_type=None):
+        """Gets the units of a player and type from the unit indexes, without looking at the other locations.
+
+        Args:
+            player_index: The player controlling the units, 0 for you 1 for the enemy. Any player if None
+            unit_type: The type of the units. Any type if None
+
+        Returns:
+            A list of GameUnits, in the same location order as iterating over the map
+
+        """
+        keys = self.__matching_keys(player_index, unit_type)
+        locations = set()
+        for key in keys:
+            locations.update(self.__buckets[key].locations)
+        units = []
+        for index in sorted(locations, key=_ITERATION_ORDER.__getitem__):
+            for unit in self.__map[index // ARENA_SIZE][index % ARENA_SIZE]:
+                if (unit.player_index, unit.unit_type) in keys:
+                    units.append(unit)
+        return units
+
+    def get_unit_totals(self, player_index=None, unit_type=None):
+        """Gets the number, total health and total cost of the units of a player and type, kept up to date as the map changes.
+
+        Args:
+            player_index: The player controlling the units, 0 for you 1 for the enemy. Any player if None
+            unit_type: The type of the units. Any type if None
+
+        Returns:
+            A dict with "count", "health" and "cost", the total cost as [SP, MP] including upgrades
+
+        """
+        totals = {"count": 0, "health": 0, "cost": [0, 0]}
+        for key in self.__matching_keys(player_index, unit_type):
+            bucket = self.__buckets[key]
+            totals["count"] += bucket.count
+            totals["health"] += bucket.health
+            totals["cost"][0] += bucket.cost[0]
+            totals["cost"][1] += bucket.cost[1]
+        return totals
+
+    def __matching_keys(self, player_index, unit_type):
+        self.__refresh_dirty()
+        return set(key for key, bucket in self.__buckets.items() if bucket.count > 0 and
+            (player_index is None or key[0] == player_index) and (unit_type is None or key[1] == unit_type))
+
+    def __refresh_dirty(self):
+        # Indexes the locations handed out by get_writable_units again, and checks whether they still hold a structure
+        if not self.__dirty:
+            return
+        changed = False
+        for index in self.__dirty:
+            self.__index_location(index)
+            blocked = any(unit.stationary for unit in self.__map[index // ARENA_SIZE][index % ARENA_SIZE])
+            if blocked != self.__blocked[index]:
+                self.__blocked[index] = blocked
+                changed = True
+        self.__dirty = set()
+        if changed:
+            self.version += 1
+
+    def __write_indexes(self):
+        if not self.__buckets_owned:
+            self.__buckets = {key: bucket.copy() for key, bucket in self.__buckets.items()}
+            self.__cell_entries = {index: list(entries) for index, entries in self.__cell_entries.items()}
+            self.__buckets_owned = True
+        return self.__buckets
+
+    def __index_unit(self, index, unit):
+        buckets = self.__write_indexes()
+        key = (unit.player_index, unit.unit_type)
+        cost = unit.stats.cost
+        self.__cell_entries.setdefault(index, []).append((key, unit.health, cost))
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = _UnitBucket()
+        bucket.locations[index] = bucket.locations.get(index, 0) + 1
+        bucket.count += 1
+        bucket.health += unit.health
+        bucket.cost[0] += cost[0]
+        bucket.cost[1] += cost[1]
+
+    def __unindex_location(self, index):
+        buckets = self.__write_indexes()
+        for key, health, cost in self.__cell_entries.pop(index, ()):
+            bucket = buckets[key]
+            remaining = bucket.locations[index] - 1
+            if remaining:
+                bucket.locations[index] = remaining
             else:
-                new_location = [new_location[0]+1, new_location[1]]
-        self.__start = new_location
-        return location 
+                del bucket.locations[index]
+            bucket.count -= 1
+            bucket.health -= health
+            bucket.cost[0] -= cost[0]
+            bucket.cost[1] -= cost[1]
+
+    def __index_location(self, index):
+        self.__unindex_location(index)
+        for unit in self.__map[index // ARENA_SIZE][index % ARENA_SIZE]:
+            self.__index_unit(index, unit)
 
     def __empty_grid(self):
         grid = []
@@ -89,6 +462,9 @@ class GameMap:
         
         """
         x, y = location
+        if type(x) is int and type(y) is int:
+            return 0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE and IN_ARENA[x * ARENA_SIZE + y] == 1
+
         half_board = self.HALF_ARENA
 
         row_size = y + 1
@@ -117,8 +493,7 @@ class GameMap:
             self.warn("Passed invalid quadrant_description '{}'. See the documentation for valid inputs for get_edge_locations.".format(quadrant_description))
             return
 
-        edges = self.get_edges()
-        return edges[quadrant_description]
+        return [[x, y] for x, y in EDGE_LOCATIONS[quadrant_description]]
 
     def get_edges(self):
         """Gets all of the edges and their edge locations
@@ -127,35 +502,16 @@ class GameMap:
             A list with four lists inside of it of locations corresponding to the four edges.
             [0] = top_right, [1] = top_left, [2] = bottom_left, [3] = bottom_right.
         """
-        top_right = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA + num
-            y = self.ARENA_SIZE - 1 - num
-            top_right.append([int(x), int(y)])
-        top_left = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA - 1 - num
-            y = self.ARENA_SIZE - 1 - num
-            top_left.append([int(x), int(y)])
-        bottom_left = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA - 1 - num
-            y = num
-            bottom_left.append([int(x), int(y)])
-        bottom_right = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA + num
-            y = num
-            bottom_right.append([int(x), int(y)])
-        return [top_right, top_left, bottom_left, bottom_right]
+        return [[[x, y] for x, y in edge] for edge in EDGE_LOCATIONS]
     
-    def add_unit(self, unit_type, location, player_index=0):
-        """Add a single GameUnit to the map at the given location.
+    def add_unit(self, unit_type, location, player_index=0, num=1):
+        """Add a GameUnit to the map at the given location.
 
         Args:
             unit_type: The type of the new unit. Use the constants provided in algo_strategy.
             location: A list of two integers representing the [x,y] coordinate of the new unit
             player_index: The index corresponding to the player controlling the new unit, 0 for you 1 for the enemy
+            num: The number of mobile units to add. Only one structure can be added to a location
 
         This function does not affect your turn and only changes the data stored in GameMap. The intended use of this function
         is to allow you to create arbitrary gamestates. Using this function on the game_map provided with game_state will 
@@ -169,9 +525,38 @@ class GameMap:
         x, y = location
         new_unit = GameUnit(unit_type, self.config, player_index, None, location[0], location[1])
         if not new_unit.stationary:
-            self.__map[x][y].append(new_unit)
+            units = self.__own(x, y)
+            new_units = [new_unit] + [copy.copy(new_unit) for _ in range(num - 1)]
+            units.extend(new_units)
+            for unit in new_units:
+                self.__index_unit(x * self.ARENA_SIZE + y, unit)
         else:
             self.__map[x][y] = [new_unit]
+            self.__owned[x * self.ARENA_SIZE + y] = 1
+            self.__blocked[x * self.ARENA_SIZE + y] = 1
+            self.__index_location(x * self.ARENA_SIZE + y)
+        self.__occupied.add(x * self.ARENA_SIZE + y)
+        self.version += 1
+
+    def place_unit(self, unit):
+        """Add an existing GameUnit to the map at the unit's own location, next to any units already there.
+
+        Args:
+            unit: The GameUnit to place. Its x and y attributes must be set.
+
+        This is how GameState fills in the map when it parses the game state. Like add_unit, it only changes the data stored in GameMap.
+        """
+        x, y = unit.x, unit.y
+        if not self.in_arena_bounds([x, y]):
+            self._invalid_coordinates([x, y])
+            return
+
+        self.__own(x, y).append(unit)
+        if unit.stationary:
+            self.__blocked[x * self.ARENA_SIZE + y] = 1
+        self.__index_unit(x * self.ARENA_SIZE + y, unit)
+        self.__occupied.add(x * self.ARENA_SIZE + y)
+        self.version += 1
 
     def remove_unit(self, location):
         """Remove all units on the map in the given location.
@@ -187,6 +572,11 @@ class GameMap:
         
         x, y = location
         self.__map[x][y] = []
+        self.__owned[x * self.ARENA_SIZE + y] = 1
+        self.__occupied.discard(x * self.ARENA_SIZE + y)
+        self.__unindex_location(x * self.ARENA_SIZE + y)
+        self.__blocked[x * self.ARENA_SIZE + y] = 0
+        self.version += 1
 
     def get_locations_in_range(self, location, radius):
         """Gets locations in a circular area around a location
@@ -205,16 +595,21 @@ class GameMap:
             self._invalid_coordinates(location)
 
         x, y = location
-        locations = []
-        search_radius = math.ceil(radius)
         getHitRadius = self.config["unitInformation"][0]['getHitRadius']
-        for i in range(int(x - search_radius), int(x + search_radius + 1)):
-            for j in range(int(y - search_radius), int(y + search_radius + 1)):
-                new_location = [i, j]
-                # A unit with a given range affects all locations who's centers are within that range + get hit radius
-                if self.in_arena_bounds(new_location) and self.distance_between_locations(location, new_location) < radius + getHitRadius:
-                    locations.append(new_location)
-        return locations
+        if type(x) is not int or type(y) is not int:
+            locations = []
+            search_radius = math.ceil(radius)
+            for i in range(int(x - search_radius), int(x + search_radius + 1)):
+                for j in range(int(y - search_radius), int(y + search_radius + 1)):
+                    new_location = [i, j]
+                    # A unit with a given range affects all locations who's centers are within that range + get hit radius
+                    if self.in_arena_bounds(new_location) and self.distance_between_locations(location, new_location) < radius + getHitRadius:
+                        locations.append(new_location)
+            return locations
+
+        # A unit with a given range affects all locations who's centers are within that range + get hit radius
+        return [[x + i, y + j] for i, j in range_offsets(radius, getHitRadius)
+            if 0 <= x + i < ARENA_SIZE and 0 <= y + j < ARENA_SIZE and IN_ARENA[(x + i) * ARENA_SIZE + y + j]]
 
     def distance_between_locations(self, location_1, location_2):
         """Euclidean distance
@@ -1,11 +1,16 @@
+import functools
 import math
 import json
 import sys
+import threading
 
 from .navigation import ShortestPathFinder
-from .util import send_command, debug_write
+from .util import send_commands, serialize_commands, debug_write
 from .unit import GameUnit
-from .game_map import GameMap
+from .game_map import GameMap, EDGE_LOCATIONS, EDGE_INDICES, range_offsets
+from .threat_map import ThreatMap
+from .attack_estimator import AttackEstimator
+from .time_budget import TimeBudget
 
 def is_stationary(unit_type):
     """
@@ -17,6 +22,51 @@ def is_stationary(unit_type):
     """
     return unit_type in STRUCTURE_TYPES
 
+_target_kernels = {}
+
+def _target_kernel(radius, get_hit_radius):
+    """
+        Maps the (dx, dy) offset of every location within radius to its squared distance
+        and its position in get_locations_in_range order. Cached per radius.
+    """
+    key = (radius, get_hit_radius)
+    kernel = _target_kernels.get(key)
+    if kernel is None:
+        kernel = {(i, j): (i * i + j * j, position) for position, (i, j) in enumerate(range_offsets(radius, get_hit_radius))}
+        _target_kernels[key] = kernel
+    return kernel
+
+def memoized(method):
+    """
+        Caches the results of a GameState query until units are added, removed or changed through 
+        the GameMap or GameState functions, or resources are spent. See GameState.cache_stats.
+    """
+    name = method.__name__
+
+    @functools.wraps(method)
+    def cached_method(self, *args, **kwargs):
+        version = (self.game_map.version, self._resource_version)
+        if self._memo_version != version:
+            self._memo.clear()
+            self._memo_version = version
+        key = (name, tuple(tuple(arg) if type(arg) is list else arg for arg in args), tuple(sorted(kwargs.items())))
+        stats = self._cache_stats.get(name)
+        if stats is None:
+            stats = self._cache_stats[name] = {"hits": 0, "misses": 0}
+        try:
+            value = self._memo[key]
+            stats["hits"] += 1
+        except KeyError:
+            stats["misses"] += 1
+            value = self._memo[key] = method(self, *args, **kwargs)
+        except TypeError:
+            # Arguments that can't be used as a key are not cached
+            stats["misses"] += 1
+            value = method(self, *args, **kwargs)
+        # Callers get their own copy of lists so they can't change the cached one
+        return list(value) if type(value) is list else value
+    return cached_method
+
 class GameState:
     """Represents the entire gamestate for a given turn
     Provides methods related to resources and unit deployment
@@ -52,7 +102,7 @@ class GameState:
 
         Args:
             * config (JSON): A json object containing information about the game
-            * serialized_string (string): A string containing information about the game state at the start of this turn
+            * serialized_string (string or dict): The game state at the start of this turn, as a json string or the dict it decodes to
 
         """
         self.serialized_string = serialized_string
@@ -93,6 +143,12 @@ class GameState:
         self._shortest_path_finder = ShortestPathFinder()
         self._build_stack = []
         self._deploy_stack = []
+        self._threat_maps = {}
+        self._attack_estimators = {}
+        self._memo = {}
+        self._memo_version = None
+        self._resource_version = 0
+        self._cache_stats = {}
         self._player_resources = [
                 {'SP': 0, 'MP': 0},  # player 0, which is you
                 {'SP': 0, 'MP': 0}]  # player 1, which is the opponent
@@ -101,9 +157,9 @@ class GameState:
     def __parse_state(self, state_line):
         """
         Fills in map based on the serialized game state so that self.game_map[x,y] is a list of GameUnits at that location.
-        state_line is the game state as a json string.
+        state_line is the game state as a json string, or as an already decoded dict.
         """
-        state = json.loads(state_line)
+        state = json.loads(state_line) if isinstance(state_line, str) else state_line
 
         turn_info = state["turnInfo"]
         self.turn_number = int(turn_info[1])
@@ -141,13 +197,13 @@ class GameState:
                 if unit_type == REMOVE:
                     # Quick fix will deploy engine fix soon
                     if self.contains_stationary_unit([x,y]):
-                        self.game_map[x,y][0].pending_removal = True
+                        self.game_map.get_writable_units([x, y])[0].pending_removal = True
                 elif unit_type == UPGRADE:
                     if self.contains_stationary_unit([x,y]):
-                        self.game_map[x,y][0].upgrade()
+                        self.game_map.get_writable_units([x, y])[0].upgrade()
                 else:
                     unit = GameUnit(unit_type, self.config, player_number, hp, x, y)
-                    self.game_map[x,y].append(unit)
+                    self.game_map.place_unit(unit)
 
     def __resource_required(self, unit_type):
         return self.SP if is_stationary(unit_type) else self.MP
@@ -164,6 +220,7 @@ class GameState:
             resource_key = 'SP'
         held_resource = self.get_resource(resource_type, player_index)
         self._player_resources[player_index][resource_key] = held_resource + amount
+        self._resource_version += 1
 
     def _invalid_player_index(self, index):
         self.warn("Invalid player index {} passed, player index should always be 0 (yourself) or 1 (your opponent)".format(index))
@@ -174,11 +231,16 @@ class GameState:
     def submit_turn(self):
         """Submit and end your turn.
             Must be called at the end of your turn or the algo will hang.
+            A turn can only be submitted once, later calls during the same turn are ignored.
         """
-        build_string = json.dumps(self._build_stack)
-        deploy_string = json.dumps(self._deploy_stack)
-        send_command(build_string)
-        send_command(deploy_string)
+        budget = TimeBudget.current
+        if budget is None and threading.current_thread() is not threading.main_thread():
+            self.warn("submit_turn was called from a background thread outside of a turn, ignoring it")
+            return
+        if budget is not None and not budget.claim_submission():
+            self.warn("The turn was already submitted, ignoring submit_turn")
+            return
+        send_commands(serialize_commands(self._build_stack), serialize_commands(self._deploy_stack))
 
     def get_resource(self, resource_type, player_index = 0):
         """Gets a players resources
@@ -224,6 +286,7 @@ class GameState:
         resources = self._player_resources[player_index]
         return [resources.get(resource_key1, None), resources.get(resource_key2, None)]
 
+    @memoized
     def number_affordable(self, unit_type):
         """The number of units of a given type we can afford
 
@@ -282,6 +345,7 @@ class GameState:
             MP = round(MP, 1)
         return MP
 
+    @memoized
     def type_cost(self, unit_type, upgrade=False):
         """Gets the cost of a unit based on its type
 
@@ -333,7 +397,8 @@ class GameState:
         stationary = is_stationary(unit_type)
         blocked = self.contains_stationary_unit(location) or (stationary and len(self.game_map[location[0],location[1]]) > 0)
         correct_territory = location[1] < self.HALF_ARENA
-        on_edge = location in (self.game_map.get_edge_locations(self.game_map.BOTTOM_LEFT) + self.game_map.get_edge_locations(self.game_map.BOTTOM_RIGHT))
+        location_index = location[0] * self.ARENA_SIZE + location[1]
+        on_edge = location_index in EDGE_INDICES[self.game_map.BOTTOM_LEFT] or location_index in EDGE_INDICES[self.game_map.BOTTOM_RIGHT]
 
         if self.enable_warnings:
             fail_reason = ""
@@ -373,24 +438,49 @@ class GameState:
       
         if type(locations[0]) == int:
             locations = [locations]
+        stationary = is_stationary(unit_type)
+        costs = self.type_cost(unit_type)
         spawned_units = 0
         for location in locations:
-            for i in range(num):
-                if self.can_spawn(unit_type, location, 1):
-                    x, y = map(int, location)
-                    costs = self.type_cost(unit_type)
-                    self.__set_resource(SP, 0 - costs[SP])
-                    self.__set_resource(MP, 0 - costs[MP])
-                    self.game_map.add_unit(unit_type, location, 0)
-                    if is_stationary(unit_type):
-                        self._build_stack.append((unit_type, x, y))
-                    else:
-                        self._deploy_stack.append((unit_type, x, y))
-                    spawned_units += 1
-                else:
-                    break
+            # The location and resources are checked once, then as many units as the resources allow are placed together
+            if not self.can_spawn(unit_type, location, 1):
+                continue
+            x, y = map(int, location)
+            count, resources = (1, None) if stationary else self.__affordable_batch(costs, num)
+            if resources is None:
+                self.__set_resource(SP, 0 - costs[SP])
+                self.__set_resource(MP, 0 - costs[MP])
+            else:
+                self._player_resources[0]['SP'], self._player_resources[0]['MP'] = resources
+                self._resource_version += 1
+            self.game_map.add_unit(unit_type, location, 0, count)
+            if stationary:
+                self._build_stack.append((unit_type, x, y))
+            else:
+                self._deploy_stack.extend([(unit_type, x, y)] * count)
+            spawned_units += count
+            if count < num:
+                # Gives the same warning the next unit would have failed with
+                self.can_spawn(unit_type, location, 1)
         return spawned_units
 
+    def __affordable_batch(self, costs, num):
+        """
+        Counts how many units with the given costs, up to num, can be bought one after another, 
+        and the [SP, MP] left after buying them. Matches buying them one at a time with number_affordable checks.
+        """
+        held = self.get_resources()
+        count = 0
+        while count < num:
+            if costs[SP] > 0 and math.floor(held[SP] / costs[SP]) < 1:
+                break
+            if costs[MP] > 0 and math.floor(held[MP] / costs[MP]) < 1:
+                break
+            held[SP] = held[SP] + (0 - costs[SP])
+            held[MP] = held[MP] + (0 - costs[MP])
+            count += 1
+        return count, held
+
     def attempt_remove(self, locations):
         """Attempts to remove existing friendly structures in the given locations.
 
@@ -431,7 +521,7 @@ class GameState:
             if location[1] < self.HALF_ARENA and self.contains_stationary_unit(location):
                 x, y = map(int, location)
                 existing_unit = None
-                for unit in self.game_map[x,y]:
+                for unit in self.game_map.get_writable_units([x, y]):
                     if unit.stationary:
                         existing_unit = unit
 
@@ -448,6 +538,36 @@ class GameState:
                 self.warn("Could not upgrade a unit from {}. Location has no structures or is enemy territory.".format(location))
         return spawned_units
 
+    def fork(self, share_path_cache=True):
+        """Makes a copy of this game state for trying out hypothetical moves.
+        The copy shares its map with this state copy-on-write (see GameMap.fork), 
+        and has its own resources, build and deploy stacks, so changing one state never changes the other.
+        Forking is much cheaper than copy.deepcopy, so it is fine to fork many times per turn.
+
+        Args:
+            share_path_cache: If True, the copy shares this state's pathfinder and its cached paths. 
+                Pass False for a copy that will be used on another thread.
+
+        Returns:
+            A new GameState
+
+        """
+        child = object.__new__(type(self))
+        child.__dict__.update(self.__dict__)
+        if not share_path_cache:
+            child._shortest_path_finder = ShortestPathFinder()
+        child.game_map = self.game_map.fork()
+        child._build_stack = list(self._build_stack)
+        child._deploy_stack = list(self._deploy_stack)
+        child._threat_maps = dict(self._threat_maps)
+        # Estimators find paths through the state they were made from, so they are not shared
+        child._attack_estimators = {}
+        child._memo = {}
+        child._cache_stats = {}
+        child._player_resources = [dict(resources) for resources in self._player_resources]
+        return child
+
+    @memoized
     def get_target_edge(self, start_location):
         """Gets the target edge given a starting location
 
@@ -473,7 +593,8 @@ class GameState:
 
     def find_path_to_edge(self, start_location, target_edge=None):
         """Gets the path a unit at a given location would take. 
-        If final point is not on an edge, it is a self destruct path
+        If final point is not on an edge, it is a self destruct path.
+        Paths to the same edge share cached pathing data until structures are added to or removed from the map.
 
         Args:
             start_location: The location of a hypothetical unit
@@ -491,9 +612,75 @@ class GameState:
         if target_edge is None:
             target_edge = self.get_target_edge(start_location)
 
-        end_points = self.game_map.get_edge_locations(target_edge)
+        end_points = EDGE_LOCATIONS[target_edge]
         return self._shortest_path_finder.navigate_multiple_endpoints(start_location, end_points, self)
 
+    def find_paths(self, start_locations, target_edge=None, as_indices=False):
+        """Gets the paths units at many locations would take, in one call.
+        Starts heading to the same edge share a single search, so checking every edge location
+        costs about as much as checking one or two of them with find_path_to_edge.
+
+        Args:
+            start_locations: A list of locations of hypothetical units
+            target_edge: The edge the units want to reach. game_map.TOP_LEFT, game_map.BOTTOM_RIGHT, etc. Induced from each start location if None.
+            as_indices: If True, each path is a tuple of location indices (x * ARENA_SIZE + y) instead of a list of locations
+
+        Returns:
+            A list with one path per start location, in the same order as start_locations. 
+            Each path is what find_path_to_edge would return, None for blocked or invalid start locations.
+
+        """
+        return self.__navigate_by_edge(self._shortest_path_finder.navigate_from_starts, start_locations, target_edge, as_indices)
+
+    def find_path_results(self, start_locations, target_edge=None, as_indices=False):
+        """Gets the paths units at many locations would take like find_paths, along with how each path ends.
+        Useful for telling breaches from self destructs, and for sorting spawn locations by the pocket of open locations they are in.
+
+        Args:
+            start_locations: A list of locations of hypothetical units
+            target_edge: The edge the units want to reach. game_map.TOP_LEFT, game_map.BOTTOM_RIGHT, etc. Induced from each start location if None.
+            as_indices: If True, each path is a tuple of location indices (x * ARENA_SIZE + y) instead of a list of locations
+
+        Returns:
+            A list with one PathResult per start location, in the same order as start_locations, None for blocked or invalid start locations.
+            result.reached_edge tells whether the unit breaches, result.self_destruct_tile where it self destructs otherwise.
+
+        """
+        return self.__navigate_by_edge(self._shortest_path_finder.navigate_results, start_locations, target_edge, as_indices)
+
+    def pocket_map(self):
+        """Labels every connected area of open locations, kept until structures are added to or removed from the map.
+        Two locations with the same label can reach each other.
+
+        Returns:
+            A flat list with the pocket number of every location, indexed by x * ARENA_SIZE + y.
+            -1 for blocked locations and locations outside the arena. The list is shared, so don't change it
+
+        """
+        self._shortest_path_finder.initialize_map(self)
+        return self._shortest_path_finder.pocket_map
+
+    def __navigate_by_edge(self, navigate, start_locations, target_edge, as_indices):
+        results = [None] * len(start_locations)
+        starts_by_edge = {}
+        for i, location in enumerate(start_locations):
+            if not self.game_map.in_arena_bounds(location):
+                self.warn("Attempted to perform pathing from invalid starting location {}".format(location))
+                continue
+            if self.contains_stationary_unit(location):
+                self.warn("Attempted to perform pathing from blocked starting location {}".format(location))
+                continue
+            edge = self.get_target_edge(location) if target_edge is None else target_edge
+            starts_by_edge.setdefault(edge, []).append(i)
+
+        for edge, indices in starts_by_edge.items():
+            end_points = EDGE_LOCATIONS[edge]
+            starts = [start_locations[i] for i in indices]
+            edge_results = navigate(starts, end_points, self, as_indices)
+            for i, result in zip(indices, edge_results):
+                results[i] = result
+        return results
+
     def contains_stationary_unit(self, location):
         """Check if a location is blocked, return structures unit if it is
 
@@ -508,11 +695,25 @@ class GameState:
             self.warn('Checked for stationary unit outside of arena bounds')
             return False
         x, y = map(int, location)
+        if not self.game_map.blocked[x * self.ARENA_SIZE + y]:
+            return False
         for unit in self.game_map[x,y]:
             if unit.stationary:
                 return unit
         return False
 
+    def cache_stats(self):
+        """Gets how often the cached queries (get_attackers, get_target_edge, type_cost and number_affordable) were answered from the cache. 
+        Cached answers last until units are added, removed or changed through the GameMap or GameState functions, or resources are spent, 
+        so changing units or resources directly can leave stale answers. Queries that depend on the health or position of a unit, 
+        like get_target and contains_stationary_unit, are not cached since units are often changed in place. Warnings for a repeated invalid query are only printed the first time.
+
+        Returns:
+            A dict from query name to {"hits": int, "misses": int}
+
+        """
+        return {name: dict(stats) for name, stats in self._cache_stats.items()}
+
     def warn(self, message):
         """ Used internally by game_state to print warnings
         """
@@ -531,6 +732,45 @@ class GameState:
         self.enable_warnings = not suppress
         self.game_map.enable_warnings = not suppress
 
+    def units_of(self, player_index=None, unit_type=None):
+        """Gets the units of a player and type. Units are indexed by player and type as the map changes, 
+        so this only visits the locations holding matching units.
+
+        Args:
+            player_index: The player controlling the units, 0 for you 1 for the enemy. Any player if None
+            unit_type: The type of the units, TURRET, SCOUT, etc. Any type if None
+
+        Returns:
+            A list of GameUnits
+
+        """
+        return self.game_map.get_units_of(player_index, unit_type)
+
+    def unit_totals(self, player_index=None, unit_type=None):
+        """Gets the number, total health and total cost of the units of a player and type, without visiting them.
+
+        Args:
+            player_index: The player controlling the units, 0 for you 1 for the enemy. Any player if None
+            unit_type: The type of the units, TURRET, SCOUT, etc. Any type if None
+
+        Returns:
+            A dict with "count", "health" and "cost", the total cost as [SP, MP] including upgrades
+
+        """
+        return self.game_map.get_unit_totals(player_index, unit_type)
+
+    def structure_value(self, player_index=1):
+        """Gets the SP a player has spent on the structures standing on the map, including upgrades.
+
+        Args:
+            player_index: The player controlling the structures, 0 for you 1 for the enemy
+
+        Returns:
+            The total SP cost of the player's structures
+
+        """
+        return sum(self.game_map.get_unit_totals(player_index, unit_type)["cost"][SP] for unit_type in STRUCTURE_TYPES)
+
     def get_target(self, attacking_unit):
         """Returns target of given unit based on current map of the game board. 
         A Unit can often have many other units in range, and Units that attack do so once each frame.
@@ -610,6 +850,74 @@ class GameState:
                     target_x_distance = unit_x_distance
         return target
 
+    def resolve_targets(self, attackers):
+        """Finds the targets of many units at once. Each result is the unit get_target would return for that attacker.
+
+        The units each player can attack are gathered once, and the targeting priority of get_target is encoded
+        as a single sortable key, (squared distance, health, y, distance of x from the center), so picking a target 
+        is a min over the units in range instead of a scan of every location in range.
+
+        Args:
+            attackers: A list of GameUnits
+
+        Returns:
+            A list with the GameUnit each attacker would choose to attack, or None, in the same order as attackers
+
+        """
+        get_hit_radius = self.config["unitInformation"][0]['getHitRadius']
+        candidates_by_player = {}
+        targets = []
+        for attacker in attackers:
+            if not isinstance(attacker, GameUnit) or type(attacker.x) is not int or type(attacker.y) is not int or not self.game_map.in_arena_bounds([attacker.x, attacker.y]):
+                # get_target warns about these, or handles them without a kernel
+                targets.append(self.get_target(attacker))
+                continue
+            candidates = candidates_by_player.get(attacker.player_index)
+            if candidates is None:
+                candidates = candidates_by_player[attacker.player_index] = self.__target_candidates(attacker.player_index)
+            mobile_cells, structure_cells = candidates
+            kernel = _target_kernel(attacker.attackRange, get_hit_radius)
+            # Mobile units always come first, so structures are only looked at when no mobile unit is in range
+            target = self.__closest_target(attacker, mobile_cells, kernel) if attacker.damage_i != 0 else None
+            if target is None and attacker.damage_f != 0:
+                target = self.__closest_target(attacker, structure_cells, kernel)
+            targets.append(target)
+        return targets
+
+    def __target_candidates(self, player_index):
+        # The units a unit of player_index can attack, by location, with the parts of their targeting key that don't depend on the attacker
+        height = 1 if player_index == 0 else -1
+        mobile_cells = {}
+        structure_cells = {}
+        for unit in self.game_map.iter_units():
+            if unit.player_index == player_index:
+                continue
+            cells = structure_cells if unit.stationary else mobile_cells
+            entries = cells.setdefault((unit.x, unit.y), [])
+            entries.append((unit.health, height * unit.y, -abs(self.HALF_ARENA - 0.5 - unit.x), len(entries), unit))
+        return mobile_cells, structure_cells
+
+    def __closest_target(self, attacker, cells, kernel):
+        x, y = attacker.x, attacker.y
+        best = None
+        target = None
+        # Scan whichever is smaller, the locations in range or the locations holding candidates
+        if len(cells) < len(kernel):
+            found = ((kernel.get((cx - x, cy - y)), entries) for (cx, cy), entries in cells.items())
+        else:
+            found = ((value, cells.get((x + i, y + j))) for (i, j), value in kernel.items())
+        for in_range, entries in found:
+            if in_range is None or entries is None:
+                continue
+            squared_distance, position = in_range
+            for health, height, x_distance, order, unit in entries:
+                rank = (squared_distance, health, height, x_distance, position, order)
+                if best is None or rank < best:
+                    best = rank
+                    target = unit
+        return target
+
+    @memoized
     def get_attackers(self, location, player_index):
         """Gets the stationary units threatening a given location
 
@@ -641,3 +949,46 @@ class GameState:
                 if unit.damage_i + unit.damage_f > 0 and unit.player_index != player_index and self.game_map.distance_between_locations(location, location_unit) <= unit.attackRange:
                     attackers.append(unit)
         return attackers
+
+    def threat_map(self, player_index):
+        """Gets the threat every location is under from the opponent of the given player.
+        The map is built once and reused until units are added to or removed from the game map.
+
+        Args:
+            player_index: The index corresponding to the defending player, 0 for you 1 for the enemy
+
+        Returns:
+            A ThreatMap. threat_map.damage[x][y] is the damage per frame a mobile unit of player_index takes at [x, y],
+            threat_map.attackers[x][y] matches len(get_attackers([x, y], player_index)).
+
+        """
+        if not player_index == 0 and not player_index == 1:
+            self._invalid_player_index(player_index)
+            return
+
+        cached = self._threat_maps.get(player_index)
+        if cached is None or cached[0] != self.game_map.version:
+            cached = (self.game_map.version, ThreatMap(self, player_index))
+            self._threat_maps[player_index] = cached
+        return cached[1]
+
+    def attack_estimator(self, player_index=0):
+        """Gets an estimator of what groups of mobile units sent by a player would do: survivors, breaches and structure damage.
+        The estimator is kept until units are added to or removed from the game map, so its paths and threat map are reused.
+
+        Args:
+            player_index: The player sending the units, 0 for you 1 for the enemy
+
+        Returns:
+            An AttackEstimator. attack_estimator().estimate(location, SCOUT, 5) estimates spawning 5 scouts at location
+
+        """
+        if not player_index == 0 and not player_index == 1:
+            self._invalid_player_index(player_index)
+            return
+
+        cached = self._attack_estimators.get(player_index)
+        if cached is None or cached[0] != self.game_map.version:
+            cached = (self.game_map.version, AttackEstimator(self, player_index))
+            self._attack_estimators[player_index] = cached
+        return cached[1]
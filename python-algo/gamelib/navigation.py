@@ -1,24 +1,297 @@
 import heapq
-import math
 import sys
-import queue
+import weakref
+from collections import deque
 from .util import debug_write
+from .game_map import ARENA_SIZE, HALF_ARENA, IN_ARENA
 
-class Node:
-    """A pathfinding node
+"""
+The pathfinder works on flat arrays indexed by x * ARENA_SIZE + y instead of a
+grid of node objects. The tables below depend only on the shape of the arena,
+so they are built once when the module is imported.
+"""
+ARENA_CELLS = ARENA_SIZE * ARENA_SIZE
+
+
+def _build_neighbors(bounds):
+    # Neighbors are listed in the order up, down, right, left. The tie breaking
+    # in _choose_next_move depends on this order.
+    neighbors = []
+    for index in range(ARENA_CELLS):
+        x, y = divmod(index, ARENA_SIZE)
+        cells = []
+        for nx, ny in ((x, y + 1), (x, y - 1), (x + 1, y), (x - 1, y)):
+            if 0 <= nx < ARENA_SIZE and 0 <= ny < ARENA_SIZE and bounds[nx * ARENA_SIZE + ny]:
+                cells.append(nx * ARENA_SIZE + ny)
+        neighbors.append(tuple(cells))
+    return tuple(neighbors)
+
+
+def _build_idealness(direction):
+    # The idealness of every tile for units heading towards the given direction.
+    # Each tile gets a distinct value, so the most ideal tile of an area is unique.
+    dx, dy = direction
+    idealness = []
+    for index in range(ARENA_CELLS):
+        x, y = divmod(index, ARENA_SIZE)
+        value = ARENA_SIZE * y if dy == 1 else ARENA_SIZE * (ARENA_SIZE - 1 - y)
+        value += x if dx == 1 else ARENA_SIZE - 1 - x
+        idealness.append(value)
+    return idealness
+
+
+ARENA_INDICES = tuple(index for index in range(ARENA_CELLS) if IN_ARENA[index])
+NEIGHBORS = _build_neighbors(IN_ARENA)
+CELL_X = tuple(index // ARENA_SIZE for index in range(ARENA_CELLS))
+CELL_Y = tuple(index % ARENA_SIZE for index in range(ARENA_CELLS))
+IDEALNESS = {direction: _build_idealness(direction) for direction in ((1, 1), (-1, 1), (-1, -1), (1, -1))}
+
+_CLEAR = bytes(ARENA_CELLS)
+_UNVISITED = [-1] * ARENA_CELLS
+
+
+def location_index(location):
+    """Converts an [x, y] location to its index in the flat pathfinding arrays
+
+    Args:
+        location: A map location
+
+    Returns:
+        x * ARENA_SIZE + y
+
+    """
+    return location[0] * ARENA_SIZE + location[1]
+
+
+def distance_field(blocked, sources):
+    """Breadth first search outwards from a set of source locations
+
+    Args:
+        blocked: A flat array with a truthy value at the index of every blocked location
+        sources: The location indices the search starts from. Blocked sources get a distance of 0 but are never expanded.
+
+    Returns:
+        A flat list holding the number of steps from every location to the nearest source, -1 if no source can be reached
+
+    """
+    pathlength = list(_UNVISITED)
+    for index in sources:
+        pathlength[index] = 0
+
+    current = deque(index for index in sources if not blocked[index])
+    while current:
+        current_index = current.popleft()
+        next_pathlength = pathlength[current_index] + 1
+        for neighbor in NEIGHBORS[current_index]:
+            if blocked[neighbor] or pathlength[neighbor] != -1:
+                continue
+            pathlength[neighbor] = next_pathlength
+            current.append(neighbor)
+    return pathlength
+
+
+def repair_distance_field(pathlength, blocked, flipped, sources):
+    """Updates a distance field in place after a single location changed between blocked and open
+
+    Only the locations whose distance actually changes are visited, so placing or removing one structure
+    costs a fraction of a new distance_field search. The result is identical to a new search.
+
+    Args:
+        pathlength: The distance field from before the change, as returned by distance_field
+        blocked: The blocked locations after the change
+        flipped: The index of the location that changed
+        sources: The location indices the field was searched from
+
+    """
+    if not blocked[flipped]:
+        #A location opened up, distances can only shrink
+        if pathlength[flipped] != 0:
+            reachable = [pathlength[neighbor] for neighbor in NEIGHBORS[flipped] if not blocked[neighbor] and pathlength[neighbor] != -1]
+            if not reachable:
+                return
+            pathlength[flipped] = min(reachable) + 1
+
+        current = deque((flipped,))
+        while current:
+            current_index = current.popleft()
+            next_pathlength = pathlength[current_index] + 1
+            for neighbor in NEIGHBORS[current_index]:
+                if blocked[neighbor]:
+                    continue
+                if pathlength[neighbor] == -1 or pathlength[neighbor] > next_pathlength:
+                    pathlength[neighbor] = next_pathlength
+                    current.append(neighbor)
+        return
+
+    #A location was blocked, distances can only grow
+    old_pathlength = pathlength[flipped]
+    if old_pathlength == -1:
+        return
+    if flipped not in sources:
+        pathlength[flipped] = -1
+
+    #Find the locations that only had shortest paths through the blocked location. 
+    #Candidates are checked one distance at a time, so their own supports are already settled.
+    lost = bytearray(ARENA_CELLS)
+    lost[flipped] = 1
+    orphans = []
+    current = deque(neighbor for neighbor in NEIGHBORS[flipped] if pathlength[neighbor] == old_pathlength + 1)
+    while current:
+        current_index = current.popleft()
+        if lost[current_index]:
+            continue
+        supported_by = pathlength[current_index] - 1
+        for neighbor in NEIGHBORS[current_index]:
+            if pathlength[neighbor] == supported_by and not lost[neighbor] and not blocked[neighbor]:
+                break
+        else:
+            lost[current_index] = 1
+            orphans.append(current_index)
+            for neighbor in NEIGHBORS[current_index]:
+                if pathlength[neighbor] == supported_by + 2 and not blocked[neighbor]:
+                    current.append(neighbor)
+
+    #Give the orphaned locations new distances from their surviving neighbors
+    for index in orphans:
+        pathlength[index] = -1
+    heap = []
+    for index in orphans:
+        reachable = [pathlength[neighbor] for neighbor in NEIGHBORS[index] if not blocked[neighbor] and not lost[neighbor] and pathlength[neighbor] != -1]
+        if reachable:
+            heap.append((min(reachable) + 1, index))
+    heapq.heapify(heap)
+    while heap:
+        distance, index = heapq.heappop(heap)
+        if pathlength[index] != -1:
+            continue
+        pathlength[index] = distance
+        for neighbor in NEIGHBORS[index]:
+            if lost[neighbor] and pathlength[neighbor] == -1 and not blocked[neighbor]:
+                heapq.heappush(heap, (distance + 1, neighbor))
+
+
+def _flipped_locations(old_blocked, new_blocked, limit):
+    """The indices where two blocked arrays differ, or None if there are more than limit of them
+    """
+    difference = int.from_bytes(old_blocked, "big") ^ int.from_bytes(new_blocked, "big")
+    flipped = []
+    while difference:
+        if len(flipped) == limit:
+            return None
+        bit = difference.bit_length() - 1
+        flipped.append(ARENA_CELLS - 1 - bit // 8)
+        difference ^= 1 << bit
+    return flipped
+
+
+class _Layout:
+    """Pathing data derived from one arrangement of structures on the map
 
     Attributes :
-        * visited_idealness (bool): Have we visited this node during the idealness search step?
-        * visited_validate (bool): Have we visited this node during the validation step?
-        * blocked (bool): Is there a structures at this node's location
-        * pathlength: The distance between this node and the target location
+        * blocked (bytes): 1 at the index of every blocked location
+        * fields (dict): Distance fields keyed by the location indices they were searched from
 
     """
-    def __init__(self):
-        self.visited_idealness = False
-        self.visited_validate = False
-        self.blocked = False
-        self.pathlength = -1
+    def __init__(self, blocked, parent=None, flipped=()):
+        self.blocked = blocked
+        self.fields = {}
+        self._pockets = list(_UNVISITED)
+        self._pocket_cells = []
+        self._ideal_tiles = {}
+        #A layout that differs from this one in a few locations, whose fields can be repaired instead of searched again
+        self._parent = weakref.ref(parent) if parent is not None else None
+        self._flipped = flipped
+
+    def get_field(self, sources):
+        """The distance field searched outwards from the given location indices
+        """
+        field = self.fields.get(sources)
+        if field is not None:
+            return field
+
+        parent = self._parent() if self._parent is not None else None
+        parent_field = parent.fields.get(sources) if parent is not None else None
+        if parent_field is None:
+            field = distance_field(self.blocked, sources)
+        else:
+            field = list(parent_field)
+            blocked = bytearray(parent.blocked)
+            for index in self._flipped:
+                blocked[index] = self.blocked[index]
+                repair_distance_field(field, blocked, index, sources)
+        self.fields[sources] = field
+        return field
+
+    def get_pocket(self, index):
+        """The pocket number of the open location at index. Pockets are labelled as they are first needed.
+        """
+        pocket = self._pockets[index]
+        if pocket != -1:
+            return pocket
+
+        blocked = self.blocked
+        pockets = self._pockets
+        pocket = len(self._pocket_cells)
+        pockets[index] = pocket
+        cells = [index]
+        for cell in cells:
+            for neighbor in NEIGHBORS[cell]:
+                if not blocked[neighbor] and pockets[neighbor] == -1:
+                    pockets[neighbor] = pocket
+                    cells.append(neighbor)
+        self._pocket_cells.append(cells)
+        return pocket
+
+    def get_pocket_size(self, index):
+        """The number of open locations in the pocket of the open location at index
+        """
+        return len(self._pocket_cells[self.get_pocket(index)])
+
+    def get_pockets(self):
+        """The pocket number of every location, -1 for blocked locations and locations outside the arena
+        """
+        for index in ARENA_INDICES:
+            if not self.blocked[index]:
+                self.get_pocket(index)
+        return self._pockets
+
+    def get_ideal_tile(self, index, direction):
+        """The most ideal self destruct location in the pocket of the open location at index
+        """
+        key = (self.get_pocket(index), direction)
+        ideal = self._ideal_tiles.get(key)
+        if ideal is None:
+            ideal = max(self._pocket_cells[key[0]], key=IDEALNESS[direction].__getitem__)
+            self._ideal_tiles[key] = ideal
+        return ideal
+
+
+class PathResult:
+    """The path a unit would take from one start location, and how it ends
+
+    Attributes :
+        * path (list): The locations of the path, or a tuple of location indices if it was asked for as_indices
+        * reached_edge (bool): True if the path ends on the target edge, where the unit breaches
+        * self_destruct_tile ([x, y]): The location the unit self destructs at when no edge location can be reached, None if it reaches the edge
+        * pocket (int): The pocket number of the start location, see ShortestPathFinder.pocket_map
+        * pocket_size (int): The number of open locations connected to the start location, including it
+        * steps (int): The number of moves along the path, len(path) - 1
+
+    """
+    __slots__ = ("path", "reached_edge", "self_destruct_tile", "pocket", "pocket_size", "steps")
+
+    def __init__(self, path, reached_edge, self_destruct_tile, pocket, pocket_size):
+        self.path = path
+        self.reached_edge = reached_edge
+        self.self_destruct_tile = self_destruct_tile
+        self.pocket = pocket
+        self.pocket_size = pocket_size
+        self.steps = len(path) - 1
+
+    def __repr__(self):
+        ending = "reaches its edge" if self.reached_edge else "self destructs at {}".format(self.self_destruct_tile)
+        return "PathResult({} steps, {}, pocket {} of size {})".format(self.steps, ending, self.pocket, self.pocket_size)
+
 
 """
 This class helps with pathfinding. We guarantee the results will
@@ -28,29 +301,85 @@ code to maximise time efficiency
 class ShortestPathFinder:
     """Handles pathfinding
 
+    The finder caches the pockets and distance fields it computes for each arrangement of structures it sees.
+    Paths from every start location heading to the same edge share one breadth first search, and the cache 
+    follows the GameMap automatically as units are added or removed through GameMap or GameState functions.
+    When the structures change in only a few locations, for example when trying out a candidate structure, 
+    the distance fields are repaired around those locations instead of being searched again.
+
     Attributes :
         * HORIZONTAL (int): A constant representing a horizontal movement
         * VERTICAL (int): A constant representing a vertical movement
+        * MAX_CACHED_LAYOUTS (int): The number of structure arrangements whose pathing data is kept
+        * MAX_REPAIRED_LOCATIONS (int): Distance fields are repaired when at most this many locations changed, 0 disables repairs
 
         * game_state (:obj: GameState): The current gamestate
-        * game_map (:obj: GameMap): The current gamemap
+        * blocked (bytes): 1 at the index of every location holding a structure
+        * pocket_map (list): The pocket number of every location, -1 for blocked locations and locations outside the arena
+        * pathlength (list): The distance between each location and the target of the last path, -1 if it cannot be reached
 
     """
+    MAX_CACHED_LAYOUTS = 16
+    MAX_REPAIRED_LOCATIONS = 8
+
     def __init__(self):
         self.HORIZONTAL = 1
         self.VERTICAL = 2
         self.initialized = False
+        self.game_state = None
+        self.blocked = _CLEAR
+        self.pathlength = _UNVISITED
+        self._map_version = None
+        self._layout = None
+        self._layouts = {}
 
     def initialize_map(self, game_state):
-        """Initializes the map
+        """Initializes the map, or brings it up to date with the structures on the game_state's map
 
         Args:
             game_state: A GameState object representing the gamestate we want to traverse
         """
-        #Initialize map 
+        if self.initialized and game_state is self.game_state and game_state.game_map.version == self._map_version:
+            return
+
         self.initialized = True
         self.game_state = game_state
-        self.game_map = [[Node() for x in range(self.game_state.ARENA_SIZE)] for y in range(self.game_state.ARENA_SIZE)]
+        #The GameMap keeps track of which locations hold structures for us. Reading it can bump the version, so it is read first
+        fingerprint = bytes(game_state.game_map.blocked)
+        self._map_version = game_state.game_map.version
+        self._use_layout(fingerprint)
+        self.blocked = self._layout.blocked
+
+    def _use_layout(self, fingerprint):
+        """Switches to the cached pathing data for the given blocked locations, creating it if needed
+        """
+        layout = self._layouts.get(fingerprint)
+        if layout is None:
+            if len(self._layouts) >= self.MAX_CACHED_LAYOUTS:
+                del self._layouts[next(iter(self._layouts))]
+            parent = self._layout
+            flipped = None
+            if parent is not None and self.MAX_REPAIRED_LOCATIONS > 0:
+                flipped = _flipped_locations(parent.blocked, fingerprint, self.MAX_REPAIRED_LOCATIONS)
+            if flipped is None:
+                layout = _Layout(fingerprint)
+            else:
+                layout = _Layout(fingerprint, parent, flipped)
+            self._layouts[fingerprint] = layout
+        self._layout = layout
+
+    @property
+    def pocket_map(self):
+        return self._layout.get_pockets() if self._layout else None
+
+    def clear_cache(self):
+        """Drops all cached pathing data. Only needed if the lists inside the GameMap were edited directly.
+        """
+        self._layouts = {}
+        self._layout = None
+        self._map_version = None
+        self.blocked = _CLEAR
+        self.pathlength = _UNVISITED
 
     def navigate_multiple_endpoints(self, start_point, end_points, game_state):
         """Finds the path a unit would take to reach a set of endpoints
@@ -68,223 +397,229 @@ class ShortestPathFinder:
         if game_state.contains_stationary_unit(start_point):
             return
 
-        #Initialize map 
+        #Initialize map
         self.initialize_map(game_state)
-        #Fill in walls
-        for location in self.game_state.game_map:
-            if self.game_state.contains_stationary_unit(location):
-                self.game_map[location[0]][location[1]].blocked = True
         #Do pathfinding
-        ideal_endpoints = self._idealness_search(start_point, end_points)
-        self._validate(ideal_endpoints, end_points)
+        targets = tuple(map(location_index, end_points))
+        ideal_tile = self._idealness_search(location_index(start_point), targets, self._get_direction_from_endpoints(end_points))
+        self._validate(ideal_tile, targets)
         return self._get_path(start_point, end_points)
 
-    def _idealness_search(self, start, end_points):
+    def _idealness_search(self, start, targets, direction):
         """
-        Finds the most ideal tile in our 'pocket' of pathable space. 
-        The edge if it is available, or the best self destruct location otherwise
+        Finds the most ideal tile in our 'pocket' of pathable space.
+        None if the edge is available, the index of the best self destruct location otherwise
         """
-        current = queue.Queue()
-        current.put(start)
-        best_idealness = self._get_idealness(start, end_points)
-        self.game_map[start[0]][start[1]].visited_idealness = True
-        most_ideal = start
-
-        while not current.empty():
-            search_location = current.get()
-            for neighbor in self._get_neighbors(search_location):
-                if not self.game_state.game_map.in_arena_bounds(neighbor) or self.game_map[neighbor[0]][neighbor[1]].blocked:
-                    continue
+        #Any endpoint we can reach is perfectly ideal
+        if self._layout.get_field(targets)[start] != -1:
+            return None
+        return self._layout.get_ideal_tile(start, direction)
 
-                x, y = neighbor
-                current_idealness = self._get_idealness(neighbor, end_points)
+    def _get_direction_from_endpoints(self, end_points):
+        """Prints a message to the games debug output
 
-                if current_idealness > best_idealness:
-                    best_idealness = current_idealness
-                    most_ideal = neighbor
+        Args:
+            * end_points: A set of endpoints, should be an edge
 
-                if not self.game_map[x][y].visited_idealness and not self.game_map[x][y].blocked:
-                    self.game_map[x][y].visited_idealness = True
-                    current.put(neighbor)
+        Returns:
+            A direction (x,y) representing the edge. For example, (1,1) for the top right and (-1, 1) for the top left
 
-        return most_ideal
+        """
+        x, y = end_points[0]
+        return (-1 if x < HALF_ARENA else 1, -1 if y < HALF_ARENA else 1)
+
+    def _validate(self, ideal_tile, targets):
+        """Breadth first search of the grid, setting the pathlengths of each node
 
-    def _get_neighbors(self, location):
-        """Get the locations adjacent to a location
         """
-        x, y = location
-        return [[x, y + 1], [x, y - 1], [x + 1, y], [x - 1, y]]
+        #VALDIATION
+        #Search from every endpoint if we can reach the edge, from our most ideal tile otherwise
+        sources = targets if ideal_tile is None else (ideal_tile,)
+        self.pathlength = self._layout.get_field(sources)
 
-    def _get_direction_from_endpoints(self, end_points):
-        """Prints a message to the games debug output
+    def navigate_from_starts(self, start_points, end_points, game_state, as_indices=False):
+        """Finds the paths units at several start points would take to reach the same set of endpoints
+
+        The pockets, ideal tiles and distance fields are looked up once and shared by every start point,
+        so this costs little more than navigating from a single start point.
 
         Args:
-            * end_points: A set of endpoints, should be an edge 
+            * start_points: The starting locations of the units
+            * end_points: The end points of the units, should be a list of edge locations
+            * game_state: The current game state
+            * as_indices: If True, return each path as a tuple of location indices (x * ARENA_SIZE + y) instead of a list of locations
 
         Returns:
-            A direction [x,y] representing the edge. For example, [1,1] for the top right and [-1, 1] for the top left
+            A list with the path of each start point, in the same order as start_points.
+            The entry is None for start points that are blocked by a structure.
 
         """
-        point = end_points[0]
-        x, y = point
-        direction = [1, 1]
-        if x < self.game_state.HALF_ARENA:
-           direction[0] = -1
-        if y < self.game_state.HALF_ARENA:
-            direction[1] = -1
-        return direction
-
-    def _get_idealness(self, location, end_points):
-        """Get the idealness of a tile, the reachable tile the unit most wants to path to.
-        Better self destruct locations are more ideal. The endpoints are perfectly ideal. 
+        self.initialize_map(game_state)
+        paths = []
+        for start, found in zip(start_points, self._navigate_indices(map(location_index, start_points), end_points)):
+            if found is None:
+                paths.append(None)
+            elif as_indices:
+                paths.append(tuple(found[0]))
+            else:
+                paths.append([start] + [[CELL_X[index], CELL_Y[index]] for index in found[0][1:]])
+        return paths
+
+    def navigate_results(self, start_points, end_points, game_state, as_indices=False):
+        """Like navigate_from_starts, but says how each path ends: whether the unit reaches its edge or self destructs,
+        and how large the pocket of open locations it starts in is. These come from the same searches as the paths.
+
+        Args:
+            * start_points: The starting locations of the units
+            * end_points: The end points of the units, should be a list of edge locations
+            * game_state: The current game state
+            * as_indices: If True, each path is a tuple of location indices (x * ARENA_SIZE + y) instead of a list of locations
 
         Returns:
-            A location the unit will attempt to reach
-        """
-        if location in end_points:
-            return sys.maxsize
+            A list with a PathResult for each start point, in the same order as start_points.
+            The entry is None for start points that are blocked by a structure.
 
+        """
+        self.initialize_map(game_state)
+        layout = self._layout
+        results = []
+        for start, found in zip(start_points, self._navigate_indices(map(location_index, start_points), end_points)):
+            if found is None:
+                results.append(None)
+                continue
+            path, ideal_tile = found
+            if as_indices:
+                path = tuple(path)
+            else:
+                path = [start] + [[CELL_X[index], CELL_Y[index]] for index in path[1:]]
+            self_destruct_tile = None if ideal_tile is None else [CELL_X[ideal_tile], CELL_Y[ideal_tile]]
+            results.append(PathResult(path, ideal_tile is None, self_destruct_tile,
+                layout.get_pocket(found[0][0]), layout.get_pocket_size(found[0][0])))
+        return results
+
+    def _navigate_indices(self, start_indices, end_points):
+        """The path of location indices from each start on the current layout, and the ideal self destruct tile it heads to, 
+        None if it can reach the edge. None instead of both for blocked starts.
+        """
+        blocked = self.blocked
+        targets = tuple(map(location_index, end_points))
         direction = self._get_direction_from_endpoints(end_points)
+        found = []
+        for start_index in start_indices:
+            if blocked[start_index]:
+                found.append(None)
+                continue
+            ideal_tile = self._idealness_search(start_index, targets, direction)
+            self._validate(ideal_tile, targets)
+            found.append((self._walk(start_index, direction), ideal_tile))
+        return found
 
-        idealness = 0
-        if direction[1] == 1:
-            idealness += 28 * location[1]
-        else: 
-            idealness += 28 * (27 - location[1])
-        if direction[0] == 1:
-            idealness += location[0]
-        else: 
-            idealness += (27 - location[0])
+    def navigate_blocked(self, start_indices, end_points, blocked):
+        """Finds paths on an arbitrary set of blocked locations instead of a game state's map, for example a simulated board.
+        Layouts share the same cache as game state queries, so switching between a few similar boards stays cheap.
 
-        return idealness
+        Args:
+            * start_indices: The location indices (x * ARENA_SIZE + y) the units start from
+            * end_points: The end points of the units, should be a list of edge locations
+            * blocked: A flat array with 1 at the index of every blocked location and 0 elsewhere
 
-    def _validate(self, ideal_tile, end_points):
-        """Breadth first search of the grid, setting the pathlengths of each node
+        Returns:
+            A list with a tuple of location indices for each start, None for starts that are blocked
 
         """
-        #VALDIATION
-        #Add our most ideal tiles to current
-        current = queue.Queue()
-        if ideal_tile in end_points:
-            for location in end_points:
-               current.put(location)
-               #Set current pathlength to 0
-               self.game_map[location[0]][location[1]].pathlength = 0
-               self.game_map[location[0]][location[1]].visited_validate = True
-        else:
-            current.put(ideal_tile)
-            self.game_map[ideal_tile[0]][ideal_tile[1]].pathlength = 0
-            self.game_map[ideal_tile[0]][ideal_tile[1]].visited_validate = True
-
-        #While current is not empty
-        while not current.empty():
-            current_location = current.get()
-            current_node = self.game_map[current_location[0]][current_location[1]]
-            for neighbor in self._get_neighbors(current_location):
-                if not self.game_state.game_map.in_arena_bounds(neighbor) or self.game_map[neighbor[0]][neighbor[1]].blocked:
-                    continue
-
-                neighbor_node = self.game_map[neighbor[0]][neighbor[1]]
-                if not neighbor_node.visited_validate and not current_node.blocked:
-                    neighbor_node.pathlength = current_node.pathlength + 1
-                    neighbor_node.visited_validate = True
-                    current.put(neighbor)
-
-        #debug_write("Print after validate")
-        #self.print_map()
-        return
+        self._use_layout(bytes(blocked))
+        self.blocked = self._layout.blocked
+        #The current layout no longer matches any game state's map
+        self._map_version = None
+        return [None if found is None else tuple(found[0]) for found in self._navigate_indices(start_indices, end_points)]
 
     def _get_path(self, start_point, end_points):
         """Once all nodes are validated, and a target is found, the unit can path to its target
 
         """
         #GET THE PATH
-        path = [start_point]
-        current = start_point
+        path = self._walk(location_index(start_point), self._get_direction_from_endpoints(end_points))
+        return [start_point] + [[CELL_X[index], CELL_Y[index]] for index in path[1:]]
+
+    def _walk(self, start_index, direction):
+        """Follows the current pathlengths down from start_index, returning the location indices visited
+
+        """
+        pathlength = self.pathlength
+        path = [start_index]
+        current = start_index
         move_direction = 0
 
-        while not self.game_map[current[0]][current[1]].pathlength == 0:
-            #debug_write("current tile {} has cost {}".format(current, self.game_map[current[0]][current[1]].pathlength))
-            next_move = self._choose_next_move(current, move_direction, end_points)
-            #debug_write(next_move)
+        while not pathlength[current] == 0:
+            next_move = self._choose_next_move(current, move_direction, direction)
 
-            if current[0] == next_move[0]:
+            if CELL_X[current] == CELL_X[next_move]:
                 move_direction = self.VERTICAL
             else:
                 move_direction = self.HORIZONTAL
             path.append(next_move)
             current = next_move
-        
-        #debug_write(path)
+
         return path
-  
-    def _choose_next_move(self, current_point, previous_move_direction, end_points):
-        """Given the current location and adjacent locations, return the best 'next step' for a given unit to take
+
+    def _choose_next_move(self, current_point, previous_move_direction, direction):
+        """Given the current location index and adjacent locations, return the index of the best 'next step' for a given unit to take
         """
-        neighbors = self._get_neighbors(current_point)
-        #debug_write("Unit at {} previously moved {} and has these neighbors {}".format(current_point, previous_move_direction, neighbors))
+        blocked = self.blocked
+        pathlength = self.pathlength
 
         ideal_neighbor = current_point
-        best_pathlength = self.game_map[current_point[0]][current_point[1]].pathlength
-        for neighbor in neighbors:
-            #debug_write("Comparing champ {} and contender {}".format(ideal_neighbor, neighbor))
-            if not self.game_state.game_map.in_arena_bounds(neighbor) or self.game_map[neighbor[0]][neighbor[1]].blocked:
+        best_pathlength = pathlength[current_point]
+        for neighbor in NEIGHBORS[current_point]:
+            if blocked[neighbor]:
                 continue
 
-            new_best = False
-            x, y = neighbor
-            current_pathlength = self.game_map[x][y].pathlength
+            current_pathlength = pathlength[neighbor]
 
             #Filter by pathlength
             if current_pathlength > best_pathlength:
                 continue
-            elif current_pathlength < best_pathlength:
-                #debug_write("Contender has better pathlength at {} vs champs {}".format(current_pathlength, best_pathlength))
-                new_best = True
 
             #Filter by direction based on prev move
-            if not new_best and not self._better_direction(current_point, neighbor, ideal_neighbor, previous_move_direction, end_points):
+            if current_pathlength == best_pathlength and not self._better_direction(current_point, neighbor, ideal_neighbor, previous_move_direction, direction):
                 continue
 
             ideal_neighbor = neighbor
             best_pathlength = current_pathlength
 
-        #debug_write("Gave unit at {} new tile {}".format(current_point, ideal_neighbor))
         return ideal_neighbor
 
-    def _better_direction(self, prev_tile, new_tile, prev_best, previous_move_direction, end_points):
-        """Compare two tiles and return True if the unit would rather move to the new one
+    def _better_direction(self, prev_tile, new_tile, prev_best, previous_move_direction, direction):
+        """Compare two location indices and return True if the unit would rather move to the new one
 
         """
         #True if we are moving in a different direction than prev move and prev is not
         #If we previously moved horizontal, and now one of our options has a different x position then the other (the two options are not up/down)
-        if previous_move_direction == self.HORIZONTAL and not new_tile[0] == prev_best[0]:
+        if previous_move_direction == self.HORIZONTAL and not CELL_X[new_tile] == CELL_X[prev_best]:
             #We want to go up now. If we have not changed our y, we are not going up
-            if prev_tile[1] == new_tile[1]:
-                return False 
+            if CELL_Y[prev_tile] == CELL_Y[new_tile]:
+                return False
             return True
-        if previous_move_direction == self.VERTICAL and not new_tile[1] == prev_best[1]:
-            if prev_tile[0] == new_tile[0]:
-                #debug_write("contender {} has the same x coord as prev tile {} so we will keep best move {}".format(new_tile, prev_tile, prev_best))
+        if previous_move_direction == self.VERTICAL and not CELL_Y[new_tile] == CELL_Y[prev_best]:
+            if CELL_X[prev_tile] == CELL_X[new_tile]:
                 return False
             return True
-        if previous_move_direction == 0: 
-            if prev_tile[1] == new_tile[1]: 
+        if previous_move_direction == 0:
+            if CELL_Y[prev_tile] == CELL_Y[new_tile]:
                 return False
             return True
-        
-        #To make it here, both moves are on the same axis 
-        direction = self._get_direction_from_endpoints(end_points)
-        if new_tile[1] == prev_best[1]: #If they both moved horizontal...
-            if direction[0] == 1 and new_tile[0] > prev_best[0]: #If we moved right and right is our direction, we moved towards our direction
-                return True 
-            if direction[0] == -1 and new_tile[0] < prev_best[0]: #If we moved left and left is our direction, we moved towards our direction
-                return True 
-            return False 
-        if new_tile[0] == prev_best[0]: #If they both moved vertical...
-            if direction[1] == 1 and new_tile[1] > prev_best[1]: #If we moved up and up is our direction, we moved towards our direction
+
+        #To make it here, both moves are on the same axis
+        if CELL_Y[new_tile] == CELL_Y[prev_best]: #If they both moved horizontal...
+            if direction[0] == 1 and CELL_X[new_tile] > CELL_X[prev_best]: #If we moved right and right is our direction, we moved towards our direction
+                return True
+            if direction[0] == -1 and CELL_X[new_tile] < CELL_X[prev_best]: #If we moved left and left is our direction, we moved towards our direction
+                return True
+            return False
+        if CELL_X[new_tile] == CELL_X[prev_best]: #If they both moved vertical...
+            if direction[1] == 1 and CELL_Y[new_tile] > CELL_Y[prev_best]: #If we moved up and up is our direction, we moved towards our direction
                 return True
-            if direction[1] == -1 and new_tile[1] < prev_best[1]: #If we moved down and down is our direction, we moved towards our direction
+            if direction[1] == -1 and CELL_Y[new_tile] < CELL_Y[prev_best]: #If we moved down and down is our direction, we moved towards our direction
                 return True
             return False
         return True
@@ -297,11 +632,11 @@ class ShortestPathFinder:
             debug_write("Attempted to print_map before pathfinder initialization. Use 'this_object.initialize_map(game_state)' to initialize the map first")
             return
 
-        for y in range(28):
-            for x in range(28):
-                node = self.game_map[x][28 - y - 1]
-                if not node.blocked and not node.pathlength == -1:
-                    self._print_justified(node.pathlength)
+        for y in range(ARENA_SIZE):
+            for x in range(ARENA_SIZE):
+                index = x * ARENA_SIZE + ARENA_SIZE - y - 1
+                if not self.blocked[index] and not self.pathlength[index] == -1:
+                    self._print_justified(self.pathlength[index])
                 else:
                     sys.stderr.write("   ")
             debug_write("")
@@ -0,0 +1,209 @@
+import array
+import itertools
+import math
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+
+from .game_state import GameState
+from .time_budget import TimeBudget
+from .unit import GameUnit
+from .util import debug_write
+
+_EMPTY_UNITS = [[] for _ in range(8)]
+_tokens = itertools.count()
+
+
+def pack_state(game_state):
+    """Packs a GameState into a few flat arrays, which are much cheaper to send to another process than the json it was parsed from.
+    The config is not included, each worker already has it.
+
+    Args:
+        game_state: The GameState to pack
+
+    Returns:
+        A tuple of plain values that can be pickled, see unpack_state
+
+    """
+    units = array.array("b")
+    health = array.array("d")
+    for unit in game_state.game_map.iter_units():
+        units.extend((unit.stats.type_index, unit.player_index, unit.x, unit.y, unit.upgraded, unit.pending_removal))
+        health.append(unit.health)
+    resources = game_state._player_resources
+    stats = array.array("d", (game_state.my_health, resources[0]["SP"], resources[0]["MP"], game_state.my_time,
+        game_state.enemy_health, resources[1]["SP"], resources[1]["MP"], game_state.enemy_time))
+    return (game_state.turn_number, stats.tobytes(), units.tobytes(), health.tobytes(),
+        list(game_state._build_stack), list(game_state._deploy_stack), game_state.enable_warnings)
+
+
+def unpack_state(config, packed):
+    """Rebuilds the GameState packed by pack_state
+
+    Args:
+        config: The game config the state was made with
+        packed: What pack_state returned
+
+    Returns:
+        A new GameState with the same units, resources, and build and deploy stacks
+
+    """
+    turn_number, stats_bytes, unit_bytes, health_bytes, build_stack, deploy_stack, enable_warnings = packed
+    stats = array.array("d")
+    stats.frombytes(stats_bytes)
+    units = array.array("b")
+    units.frombytes(unit_bytes)
+    health = array.array("d")
+    health.frombytes(health_bytes)
+
+    game_state = GameState(config, {"turnInfo": [0, turn_number, -1], "p1Stats": list(stats[:4]), "p2Stats": list(stats[4:]),
+        "p1Units": _EMPTY_UNITS, "p2Units": _EMPTY_UNITS})
+    unit_information = config["unitInformation"]
+    for i in range(len(health)):
+        type_index, player_index, x, y, upgraded, pending_removal = units[i * 6:i * 6 + 6]
+        unit = GameUnit(unit_information[type_index]["shorthand"], config, player_index, None, x, y)
+        unit.health = health[i]
+        if upgraded:
+            unit.upgrade()
+        unit.pending_removal = bool(pending_removal)
+        game_state.game_map.place_unit(unit)
+    game_state._build_stack = list(build_stack)
+    game_state._deploy_stack = list(deploy_stack)
+    game_state.enable_warnings = enable_warnings
+    return game_state
+
+
+def evaluate_candidates(fn, candidates, game_state, should_stop=None):
+    """Calls fn(fork, candidate) for every candidate, each on its own fork of game_state.
+    This is what every worker runs on its share of the candidates, and what map_candidates falls back to without workers.
+
+    Args:
+        fn: A function taking a GameState and a candidate
+        candidates: A list of candidates
+        game_state: The GameState to fork for each candidate
+        should_stop: A function that returns True once the remaining candidates should be skipped
+
+    Returns:
+        A list with fn's result for each candidate, None for candidates that failed or were skipped
+
+    """
+    results = []
+    for candidate in candidates:
+        if should_stop is not None and should_stop():
+            results.extend(None for _ in range(len(candidates) - len(results)))
+            break
+        try:
+            results.append(fn(game_state.fork(), candidate))
+        except Exception:
+            debug_write("Evaluating candidate {} failed:\n{}".format(candidate, traceback.format_exc()))
+            results.append(None)
+    return results
+
+
+# The state of a worker process, set up once by _init_worker
+_worker = {}
+
+
+def _init_worker(config, generation):
+    # Anything a worker prints goes to stderr, so it can never be mistaken for a turn on the engine's stdout
+    try:
+        os.dup2(2, 1)
+    except OSError:
+        pass
+    sys.stdout = sys.stderr
+    _worker["config"] = config
+    _worker["generation"] = generation
+    _worker["state"] = (None, None)
+
+
+def _run_chunk(fn, token, packed, generation, candidates):
+    token_seen, game_state = _worker["state"]
+    if token_seen != token:
+        # Chunks of the same call share one unpacked state
+        game_state = unpack_state(_worker["config"], packed)
+        _worker["state"] = (token, game_state)
+    return evaluate_candidates(fn, candidates, game_state, lambda: _worker["generation"].value != generation)
+
+
+class WorkerPool:
+    """A pool of worker processes for evaluating many candidates in parallel, such as spawn locations or structure placements.
+    Every worker is given the game config once when it starts, and each call ships the GameState packed into flat arrays.
+    Worker output is redirected to stderr so it can't corrupt the turns the algo sends to the engine.
+    Usually started with AlgoCore.start_worker_pool and used through AlgoCore.map_candidates.
+
+    Attributes :
+        * config (JSON): The game config the workers were given
+        * processes (int): The number of worker processes
+
+    """
+    def __init__(self, config, processes=None):
+        """Starts the worker processes
+
+        Args:
+            config: A json object containing information about the game
+            processes: The number of worker processes, one per core if None
+
+        """
+        self.config = config
+        self.processes = processes or os.cpu_count() or 1
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("fork" if "fork" in methods else None)
+        # Bumped when a call runs out of time, so workers skip the rest of its candidates
+        self.__generation = context.Value("i", 0)
+        sys.stdout.flush()
+        self.__pool = context.Pool(self.processes, _init_worker, (config, self.__generation))
+
+    def map_candidates(self, fn, candidates, game_state, timeout=None, chunk_size=None):
+        """Calls fn(fork, candidate) for every candidate across the worker processes, each on its own fork of game_state,
+        and gathers the results in order.
+
+        Args:
+            fn: A function taking a GameState and a candidate. It has to be defined at the top level of a module so it can be sent to the workers
+            candidates: A list of candidates. They and fn's results have to be picklable
+            game_state: The GameState to evaluate the candidates on
+            timeout: The longest time in seconds to wait. The time left before the soft limit of TimeBudget.current if None
+            chunk_size: The number of candidates sent to a worker at once. Chosen so each worker gets about 4 chunks if None
+
+        Returns:
+            A list with fn's result for each candidate, None for candidates that failed or didn't finish in time
+
+        """
+        candidates = list(candidates)
+        if not candidates:
+            return []
+        if timeout is None and TimeBudget.current is not None:
+            timeout = max(TimeBudget.current.remaining(), 0)
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        chunk_size = chunk_size or max(1, math.ceil(len(candidates) / (self.processes * 4)))
+
+        packed = pack_state(game_state)
+        token = (os.getpid(), next(_tokens))
+        generation = self.__generation.value
+        chunks = [candidates[i:i + chunk_size] for i in range(0, len(candidates), chunk_size)]
+        pending = [self.__pool.apply_async(_run_chunk, (fn, token, packed, generation, chunk)) for chunk in chunks]
+
+        results = []
+        timed_out = False
+        for chunk, result in zip(chunks, pending):
+            try:
+                wait = None if deadline is None else max(deadline - time.perf_counter(), 0)
+                results.extend(result.get(wait))
+                continue
+            except multiprocessing.TimeoutError:
+                timed_out = True
+            except Exception:
+                debug_write("A worker failed:\n{}".format(traceback.format_exc()))
+            results.extend(None for _ in chunk)
+        if timed_out:
+            debug_write("map_candidates ran out of time, {} of {} candidates finished".format(
+                sum(1 for result in results if result is not None), len(candidates)))
+            with self.__generation.get_lock():
+                self.__generation.value += 1
+        return results
+
+    def close(self):
+        """Stops the worker processes"""
+        self.__pool.terminate()
+        self.__pool.join()
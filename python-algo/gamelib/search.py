@@ -0,0 +1,391 @@
+import math
+import random
+
+# The unit type shorthands (WALL, SCOUT, REMOVE, STRUCTURE_TYPES, etc.) are read from the config when a GameState is made
+from . import game_state as _unit_types
+from .game_map import ARENA_SIZE, HALF_ARENA, EDGE_LOCATIONS, EDGE_INDICES
+from .time_budget import TimeBudget
+from .unit import unit_stats
+
+SPAWN = "spawn"
+UPGRADE = "upgrade"
+REMOVE = "remove"
+
+# The edges each player deploys mobile units on, indexed by player
+_DEPLOY_EDGES = ((2, 3), (0, 1))
+# The iterations Planner.mcts runs when it has neither a time budget nor max_iterations
+UNBUDGETED_ITERATIONS = 1000
+
+
+class Action:
+    """A single build or deploy action, the arguments of one attempt_spawn, attempt_upgrade or attempt_remove call.
+    Actions are hashable and sortable, so plans holding the same actions in a different order can be recognized.
+
+    Attributes :
+        * kind (string): SPAWN, UPGRADE or REMOVE
+        * unit_type (string): The type of unit to spawn, None for upgrades and removals
+        * x (int): The x coordinate of the location
+        * y (int): The y coordinate of the location
+
+    """
+    __slots__ = ("kind", "unit_type", "x", "y")
+
+    def __init__(self, kind, unit_type, location):
+        self.kind = kind
+        self.unit_type = unit_type
+        self.x, self.y = int(location[0]), int(location[1])
+
+    @property
+    def location(self):
+        return [self.x, self.y]
+
+    def key(self):
+        return (self.kind, self.unit_type or "", self.x, self.y)
+
+    def is_legal(self, game_state):
+        """Checks if the action can be taken, like GameState.can_spawn but without printing warnings
+
+        Args:
+            game_state: The GameState to check against
+
+        Returns:
+            True if applying the action to game_state would succeed
+
+        """
+        location = [self.x, self.y]
+        if not game_state.game_map.in_arena_bounds(location) or self.y >= HALF_ARENA:
+            return False
+        structure = game_state.contains_stationary_unit(location)
+        if self.kind == SPAWN:
+            stats = unit_stats(game_state.config, self.unit_type)
+            if structure or game_state.number_affordable(self.unit_type) < 1:
+                return False
+            if stats.stationary:
+                return len(game_state.game_map[self.x, self.y]) == 0
+            index = self.x * ARENA_SIZE + self.y
+            return any(index in EDGE_INDICES[edge] for edge in _DEPLOY_EDGES[0])
+        if not structure or structure.player_index != 0:
+            return False
+        if self.kind == UPGRADE:
+            if structure.upgraded or "upgrade" not in game_state.config["unitInformation"][structure.stats.type_index]:
+                return False
+            resources = game_state.get_resources()
+            costs = game_state.type_cost(structure.unit_type, True)
+            return resources[0] >= costs[0] and resources[1] >= costs[1]
+        return (_unit_types.REMOVE, self.x, self.y) not in game_state._build_stack
+
+    def apply(self, game_state):
+        """Takes the action on game_state
+
+        Returns:
+            The number of units spawned, upgraded or flagged for removal
+
+        """
+        if self.kind == SPAWN:
+            return game_state.attempt_spawn(self.unit_type, [self.x, self.y])
+        if self.kind == UPGRADE:
+            return game_state.attempt_upgrade([self.x, self.y])
+        return game_state.attempt_remove([self.x, self.y])
+
+    def __eq__(self, other):
+        return isinstance(other, Action) and self.key() == other.key()
+
+    def __hash__(self):
+        return hash(self.key())
+
+    def __repr__(self):
+        if self.kind == SPAWN:
+            return "Action({}, {}, {})".format(self.kind, self.unit_type, [self.x, self.y])
+        return "Action({}, {})".format(self.kind, [self.x, self.y])
+
+
+def legal_actions(game_state, unit_types=None, kinds=(SPAWN, UPGRADE), candidates=None):
+    """Lists the actions that can currently be taken
+
+    Args:
+        game_state: The GameState to take actions in
+        unit_types: The unit types to consider spawning. Every structure type if None
+        kinds: The kinds of actions to consider, SPAWN, UPGRADE and/or REMOVE
+        candidates: If given, only the legal actions among this list of Actions are returned
+
+    Returns:
+        A list of Actions, structures ordered like the map locations
+
+    """
+    if candidates is not None:
+        return [action for action in candidates if action.kind in kinds and action.is_legal(game_state)]
+
+    game_map = game_state.game_map
+    config = game_state.config
+    if unit_types is None:
+        unit_types = _unit_types.STRUCTURE_TYPES
+    actions = []
+    if SPAWN in kinds:
+        for unit_type in unit_types:
+            if game_state.number_affordable(unit_type) < 1:
+                continue
+            if unit_stats(config, unit_type).stationary:
+                locations = game_map.get_locations(player_index=0)
+            else:
+                locations = EDGE_LOCATIONS[_DEPLOY_EDGES[0][0]] + EDGE_LOCATIONS[_DEPLOY_EDGES[0][1]]
+            for x, y in locations:
+                units = game_map[x, y]
+                if not units or not (units[0].stationary or unit_stats(config, unit_type).stationary):
+                    actions.append(Action(SPAWN, unit_type, [x, y]))
+    if UPGRADE in kinds or REMOVE in kinds:
+        for unit in game_map.iter_units(player_index=0, stationary=True):
+            if unit.y >= HALF_ARENA:
+                continue
+            for kind in (UPGRADE, REMOVE):
+                if kind in kinds:
+                    action = Action(kind, None, [unit.x, unit.y])
+                    if action.is_legal(game_state):
+                        actions.append(action)
+    return actions
+
+
+def defense_evaluator(start_locations=None, unit_type=None, breach_weight=10.0, damage_weight=1.0, length_weight=0.1):
+    """Makes an evaluator that scores how well a state defends against the enemy's mobile units.
+    Every start location is scored by the damage a unit takes along its path, from GameState.threat_map,
+    and the length of the path. Paths that reach their edge with the unit still alive count as predicted breaches.
+
+    Args:
+        start_locations: The locations the enemy may deploy from. Every open location on the enemy's edges if None
+        unit_type: The mobile unit to predict breaches for. SCOUT if None
+        breach_weight: The score lost per predicted breach
+        damage_weight: The score gained per point of damage taken along a path
+        length_weight: The score gained per location of a path
+
+    Returns:
+        A function taking a GameState and returning its score, the average over the start locations. Higher is better
+
+    """
+    def evaluate(game_state):
+        stats = unit_stats(game_state.config, unit_type or _unit_types.SCOUT)
+        frames_per_location = 1 / stats.speed if stats.speed > 0 else 1
+        starts = start_locations
+        if starts is None:
+            starts = [location for edge in _DEPLOY_EDGES[1] for location in EDGE_LOCATIONS[edge]
+                if not game_state.game_map.blocked[location[0] * ARENA_SIZE + location[1]]]
+        if not starts:
+            return 0
+        damage_map = game_state.threat_map(1).flat_damage()
+        score = 0
+        for result in game_state.find_path_results(starts, as_indices=True):
+            if result is None:
+                continue
+            damage = 0
+            for index in result.path:
+                damage += damage_map[index]
+            damage *= frames_per_location
+            score += damage_weight * damage + length_weight * len(result.path)
+            if result.reached_edge and damage < stats.max_health:
+                score -= breach_weight
+        return score / len(starts)
+    return evaluate
+
+
+class Plan:
+    """A list of actions and the score of the state they lead to
+
+    Attributes :
+        * actions (list): The Actions of the plan, in the order they are taken
+        * score (float): The evaluator's score for game_state
+        * game_state (GameState): A fork of the searched state with the actions taken. Its build and deploy stacks hold the turn to submit
+
+    """
+    __slots__ = ("actions", "score", "game_state", "_key")
+
+    def __init__(self, actions, score, game_state):
+        self.actions = actions
+        self.score = score
+        self.game_state = game_state
+        self._key = tuple(sorted(action.key() for action in actions))
+
+    def apply(self, game_state):
+        """Takes the plan's actions on another GameState, usually the one the search started from
+
+        Returns:
+            The number of actions that succeeded
+
+        """
+        return sum(1 for action in self.actions if action.apply(game_state))
+
+    def __repr__(self):
+        return "Plan(score={}, actions={})".format(self.score, self.actions)
+
+
+class _Node:
+    __slots__ = ("plan", "parent", "children", "untried", "visits", "value")
+
+    def __init__(self, plan, parent):
+        self.plan = plan
+        self.parent = parent
+        self.children = []
+        self.untried = None
+        self.visits = 0
+        self.value = 0.0
+
+
+class Planner:
+    """Searches for the build and deploy plan a pluggable evaluator scores best.
+    Every plan is tried on a fork of the game state, so the searched state is never changed.
+
+    Both searches are anytime: they check the time budget between evaluations, stop once the soft limit is near,
+    and return the best plan found so far. While searching, the best plan is also given to the time budget
+    with keep_best, so it is submitted even if the search overruns the hard limit.
+
+    Attributes :
+        * game_state (GameState): The state the plans start from
+        * evaluator (function): Takes a GameState and returns its score, higher is better. See defense_evaluator
+        * time_budget (TimeBudget): The budget searches stop by, or None to use TimeBudget.current of the thread when each search starts
+        * best (Plan): The best plan found so far. The empty plan before any search
+        * evaluations (int): The number of states evaluated so far
+
+    """
+    def __init__(self, game_state, evaluator, unit_types=None, kinds=(SPAWN, UPGRADE), candidates=None, time_budget=None):
+        """Scores the empty plan
+
+        Args:
+            game_state: The GameState to plan from
+            evaluator: A function taking a GameState and returning its score, higher is better
+            unit_types: The unit types to consider spawning. Every structure type if None
+            kinds: The kinds of actions to consider, SPAWN, UPGRADE and/or REMOVE.
+                Removals only happen after the turn, so evaluators that look at the map can't tell them apart from doing nothing
+            candidates: If given, only these Actions are considered, which keeps the search narrow and fast
+            time_budget: The TimeBudget to stop searching by. If None, each search uses TimeBudget.current when it starts, with no time limit if there is none
+
+        """
+        self.game_state = game_state
+        self.evaluator = evaluator
+        self.unit_types = unit_types
+        self.kinds = kinds
+        self.candidates = candidates
+        self.time_budget = time_budget
+        self.evaluations = 0
+        self.__budget = None
+        self.best = None
+        self.best = self.__evaluate([], game_state.fork())
+
+    def actions(self, game_state):
+        """The actions the search considers in game_state"""
+        return legal_actions(game_state, self.unit_types, self.kinds, self.candidates)
+
+    def out_of_time(self):
+        """True once the search should stop and return its best plan"""
+        return self.__budget is not None and self.__budget.should_stop()
+
+    def beam_search(self, beam_width=8, max_depth=8):
+        """Grows plans one action at a time, keeping the beam_width best plans of each length
+
+        Args:
+            beam_width: The number of plans kept after each step
+            max_depth: The most actions in a plan
+
+        Returns:
+            The best Plan found
+
+        """
+        self.__start_search()
+        beam = [self.best]
+        seen = set([self.best._key])
+        for _ in range(max_depth):
+            children = []
+            for plan in beam:
+                for action in self.actions(plan.game_state):
+                    if self.out_of_time():
+                        return self.best
+                    key = tuple(sorted(plan._key + (action.key(),)))
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    children.append(self.__extend(plan, action))
+            if not children:
+                break
+            children.sort(key=lambda child: child.score, reverse=True)
+            beam = children[:beam_width]
+        return self.best
+
+    def mcts(self, max_depth=8, exploration=1.4, max_iterations=None, seed=None):
+        """Monte Carlo tree search. Each iteration picks a plan with UCT, adds one action to it,
+        finishes it with random actions and scores the result.
+
+        Args:
+            max_depth: The most actions in a plan
+            exploration: The UCT exploration constant. Scores are scaled to [0, 1] by the range seen so far
+            max_iterations: The most iterations to run. If None, no maximum with a time budget and UNBUDGETED_ITERATIONS without one
+            seed: Seeds the random choices, for reproducible searches
+
+        Returns:
+            The best Plan found
+
+        """
+        self.__start_search()
+        rng = random.Random(seed)
+        root = _Node(self.best, None)
+        low = high = self.best.score
+        iteration = 0
+        if max_iterations is None and self.__budget is None:
+            max_iterations = UNBUDGETED_ITERATIONS
+        while (max_iterations is None or iteration < max_iterations) and not self.out_of_time():
+            iteration += 1
+            node = root
+            depth = 0
+            while True:
+                if node.untried is None:
+                    node.untried = self.actions(node.plan.game_state) if depth < max_depth else []
+                    rng.shuffle(node.untried)
+                if node.untried or not node.children:
+                    break
+                scale = (high - low) or 1
+                log_visits = math.log(node.visits)
+                node = max(node.children, key=lambda child: (child.value / child.visits - low) / scale +
+                    exploration * math.sqrt(log_visits / child.visits))
+                depth += 1
+
+            if node.untried:
+                node.children.append(_Node(self.__extend(node.plan, node.untried.pop()), node))
+                node = node.children[-1]
+                depth += 1
+            score = self.__rollout(node.plan, max_depth - depth, rng)
+            low, high = min(low, score), max(high, score)
+            while node is not None:
+                node.visits += 1
+                node.value += score
+                node = node.parent
+        return self.best
+
+    def __start_search(self):
+        # Read when a search starts rather than when the planner is made, which may be in an earlier turn
+        self.__budget = self.time_budget if self.time_budget is not None else TimeBudget.current
+        if self.__budget is not None:
+            self.__budget.keep_best(self.best.game_state)
+
+    def __rollout(self, plan, steps, rng):
+        actions = list(plan.actions)
+        game_state = plan.game_state.fork()
+        for _ in range(steps):
+            options = self.actions(game_state)
+            # Stopping early is one of the choices, so short plans are sampled too
+            choice = rng.randrange(len(options) + 1)
+            if choice == len(options):
+                break
+            options[choice].apply(game_state)
+            actions.append(options[choice])
+        if len(actions) == len(plan.actions):
+            return plan.score
+        return self.__evaluate(actions, game_state).score
+
+    def __extend(self, plan, action):
+        game_state = plan.game_state.fork()
+        action.apply(game_state)
+        return self.__evaluate(plan.actions + [action], game_state)
+
+    def __evaluate(self, actions, game_state):
+        plan = Plan(actions, self.evaluator(game_state), game_state)
+        self.evaluations += 1
+        if self.best is None or plan.score > self.best.score:
+            self.best = plan
+            if self.__budget is not None:
+                self.__budget.keep_best(game_state)
+        return plan
@@ -0,0 +1,360 @@
+import math
+
+from .game_map import ARENA_SIZE, HALF_ARENA, EDGE_LOCATIONS, EDGE_INDICES, range_offsets
+from .navigation import ShortestPathFinder, CELL_X, CELL_Y
+from .unit import GameUnit
+
+
+def target_edge(x, y):
+    """The edge a mobile unit at [x, y] paths towards, see GameState.get_target_edge
+    """
+    left = x < HALF_ARENA
+    bottom = y < HALF_ARENA
+    if left and bottom:
+        return 0
+    elif left:
+        return 3
+    elif bottom:
+        return 1
+    return 2
+
+
+class SimulatedUnit:
+    """A unit taking part in a simulated action phase.
+    It copies the stats of a GameUnit so the simulation never changes the game state it was seeded from.
+
+    Attributes :
+        * unit_type (string): This unit's type
+        * player_index (integer): The player that controls this unit. 0 for you, 1 for your opponent.
+        * index (integer): The unit's location as x * ARENA_SIZE + y
+        * health (float): The current health of this unit
+        * stationary (bool): Whether or not this unit is a structure
+        * upgraded (bool): If this unit is upgraded
+        * speed, damage_f, damage_i, attackRange, shieldRange, shieldPerUnit: The same as in GameUnit
+        * breach_damage (float): The damage this unit deals to the enemy's health when it breaches
+        * self_destruct_damage_f (float): The damage this unit deals to structures when it self destructs
+        * self_destruct_damage_i (float): The damage this unit deals to mobile units when it self destructs
+        * self_destruct_range (float): The radius of this unit's self destruct
+        * self_destruct_steps (int): The number of steps this unit must take before its self destruct deals damage
+        * target_edge (int): The edge a mobile unit is heading towards
+        * steps (int): The number of steps a mobile unit has taken
+
+    """
+    __slots__ = ("unit_type", "player_index", "index", "health", "stationary", "upgraded", "speed", "damage_f", "damage_i",
+        "attackRange", "shieldRange", "shieldPerUnit", "breach_damage", "self_destruct_damage_f", "self_destruct_damage_i",
+        "self_destruct_range", "self_destruct_steps", "target_edge", "steps", "path", "path_position", "path_version",
+        "move_progress", "shielded_by")
+
+    def __init__(self, unit, type_config):
+        self.unit_type = unit.unit_type
+        self.player_index = unit.player_index
+        self.index = unit.x * ARENA_SIZE + unit.y
+        self.health = unit.health
+        self.stationary = unit.stationary
+        self.upgraded = unit.upgraded
+        self.speed = unit.speed
+        self.damage_f = unit.damage_f
+        self.damage_i = unit.damage_i
+        self.attackRange = unit.attackRange
+        self.shieldRange = unit.shieldRange
+        self.shieldPerUnit = unit.shieldPerUnit
+        self.breach_damage = type_config.get("playerBreachDamage", 1.0)
+        self.self_destruct_damage_f = type_config.get("selfDestructDamageTower", 0)
+        self.self_destruct_damage_i = type_config.get("selfDestructDamageWalker", 0)
+        self.self_destruct_range = type_config.get("selfDestructRange", 0)
+        self.self_destruct_steps = type_config.get("selfDestructStepsRequired", 0)
+        self.target_edge = None if unit.stationary else target_edge(unit.x, unit.y)
+        self.steps = 0
+        self.path = None
+        self.path_position = 0
+        self.path_version = -1
+        self.move_progress = 0.0
+        self.shielded_by = None
+
+    @property
+    def location(self):
+        return [CELL_X[self.index], CELL_Y[self.index]]
+
+    def __repr__(self):
+        owner = "Friendly" if self.player_index == 0 else "Enemy"
+        return "Simulated {} {}, health: {} location: {}".format(owner, self.unit_type, self.health, self.location)
+
+
+class SimulationResult:
+    """The outcome of a simulated action phase
+
+    Attributes :
+        * frames (int): The number of frames simulated
+        * breaches (list): A (location, unit_type, player_index) entry for every unit that reached its edge
+        * self_destructs (list): A (location, unit_type, player_index) entry for every unit that self destructed
+        * destroyed (list): A (location, unit_type, player_index) entry for every unit that was destroyed by damage
+        * player_damage ([float, float]): The health each player lost to breaches, indexed by player
+        * structure_damage ([float, float]): The damage each player's structures took, indexed by player
+        * survivors (list): The SimulatedUnits still moving when the simulation stopped
+
+    """
+    def __init__(self):
+        self.frames = 0
+        self.breaches = []
+        self.self_destructs = []
+        self.destroyed = []
+        self.player_damage = [0, 0]
+        self.structure_damage = [0, 0]
+        self.survivors = []
+
+
+class Simulator:
+    """Simulates the action phase of a turn locally, frame by frame, without the game engine.
+
+    Every frame follows the engine's order of actions: mobile units are shielded by friendly support structures,
+    mobile units move along their ShortestPathFinder path at their speed, breaching when they reach their edge
+    or self destructing when they cannot move further, every unit attacks its get_target target,
+    and units without health are removed. Paths are recomputed whenever a structure is destroyed.
+
+    The simulation is an estimate. It uses the stats in the game config and the rules gamelib knows about,
+    so results can differ from the engine in the details (for example the order units act in within a frame).
+
+    Attributes :
+        * MAX_FRAMES (int): The default number of frames run() simulates before giving up
+        * frame (int): The number of frames simulated so far
+        * structures (list): The SimulatedUnit structures still standing
+        * mobile_units (list): The SimulatedUnit mobile units still on the board
+        * result (SimulationResult): What has happened so far
+
+    """
+    MAX_FRAMES = 500
+
+    def __init__(self, game_state):
+        """Copies the units on the game_state's map, including units queued with attempt_spawn
+
+        Args:
+            game_state: The GameState to simulate the action phase of
+
+        """
+        self.config = game_state.config
+        self._type_configs = {info["shorthand"]: info for info in self.config["unitInformation"] if "shorthand" in info}
+        self._get_hit_radius = self.config["unitInformation"][0].get("getHitRadius", 0)
+        self._finder = ShortestPathFinder()
+        self._blocked = bytearray(ARENA_SIZE * ARENA_SIZE)
+        self._layout_version = 0
+        self._paths = {}
+        self._mobile_cells = [{}, {}]
+        self._structure_cells = [{}, {}]
+        self.frame = 0
+        self.structures = []
+        self.mobile_units = []
+        self.result = SimulationResult()
+
+        for unit in game_state.game_map.iter_units():
+            self._place(SimulatedUnit(unit, self._type_configs[unit.unit_type]))
+
+    def add_unit(self, unit_type, location, player_index=0, num=1):
+        """Adds hypothetical units to the simulation without changing the game state
+
+        Args:
+            unit_type: The type of the new units
+            location: The [x, y] location of the new units
+            player_index: The player controlling the new units, 0 for you 1 for the enemy
+            num: The number of units to add
+
+        """
+        unit = GameUnit(unit_type, self.config, player_index, None, location[0], location[1])
+        for _ in range(num):
+            self._place(SimulatedUnit(unit, self._type_configs[unit_type]))
+
+    def run(self, max_frames=None):
+        """Simulates frames until no mobile units are left
+
+        Args:
+            max_frames: The most frames to simulate, MAX_FRAMES if None
+
+        Returns:
+            The SimulationResult
+
+        """
+        max_frames = self.MAX_FRAMES if max_frames is None else max_frames
+        while self.mobile_units and self.frame < max_frames:
+            self.step()
+        self.result.survivors = list(self.mobile_units)
+        return self.result
+
+    def step(self):
+        """Simulates a single frame
+
+        Returns:
+            True if mobile units are still on the board
+
+        """
+        self.frame += 1
+        self.result.frames = self.frame
+        self._shield()
+        self._move()
+        self._attack()
+        self._remove_dead()
+        return bool(self.mobile_units)
+
+    def _place(self, unit):
+        player = unit.player_index
+        if unit.stationary:
+            self.structures.append(unit)
+            self._structure_cells[player][unit.index] = unit
+            self._blocked[unit.index] = 1
+        else:
+            self.mobile_units.append(unit)
+            self._mobile_cells[player].setdefault(unit.index, []).append(unit)
+
+    def _unplace(self, unit):
+        player = unit.player_index
+        if unit.stationary:
+            self.structures.remove(unit)
+            del self._structure_cells[player][unit.index]
+            self._blocked[unit.index] = 0
+            self._layout_version += 1
+            self._paths = {}
+        else:
+            self.mobile_units.remove(unit)
+            self.__leave_cell(unit)
+
+    def __leave_cell(self, unit):
+        cells = self._mobile_cells[unit.player_index]
+        stack = cells[unit.index]
+        stack.remove(unit)
+        if not stack:
+            del cells[unit.index]
+
+    def _units_in_range(self, index, radius, player_index, structures=True, mobile_units=True):
+        """The units of player_index within radius of the location at index, in get_locations_in_range order
+        """
+        x, y = CELL_X[index], CELL_Y[index]
+        found = []
+        mobile_cells = self._mobile_cells[player_index] if mobile_units else {}
+        structure_cells = self._structure_cells[player_index] if structures else {}
+        for i, j in range_offsets(radius, self._get_hit_radius):
+            nx, ny = x + i, y + j
+            if not (0 <= nx < ARENA_SIZE and 0 <= ny < ARENA_SIZE):
+                continue
+            cell = nx * ARENA_SIZE + ny
+            if cell in structure_cells:
+                found.append(structure_cells[cell])
+            if cell in mobile_cells:
+                found.extend(mobile_cells[cell])
+        return found
+
+    def _shield(self):
+        for support in self.structures:
+            if support.shieldRange <= 0 or support.shieldPerUnit <= 0:
+                continue
+            for unit in self._units_in_range(support.index, support.shieldRange, support.player_index, structures=False):
+                if unit.shielded_by is None:
+                    unit.shielded_by = set()
+                if support not in unit.shielded_by:
+                    unit.shielded_by.add(support)
+                    unit.health += support.shieldPerUnit
+
+    def _path(self, unit):
+        if unit.path_version != self._layout_version:
+            key = (unit.index, unit.target_edge)
+            path = self._paths.get(key)
+            if path is None:
+                path = self._finder.navigate_blocked([unit.index], EDGE_LOCATIONS[unit.target_edge], self._blocked)[0]
+                self._paths[key] = path
+            unit.path = path
+            unit.path_position = 0
+            unit.path_version = self._layout_version
+        return unit.path
+
+    def _move(self):
+        for unit in list(self.mobile_units):
+            unit.move_progress += unit.speed
+            if unit.move_progress < 1:
+                continue
+            unit.move_progress -= 1
+
+            path = self._path(unit)
+            if unit.path_position + 1 >= len(path):
+                self._self_destruct(unit)
+                continue
+
+            unit.path_position += 1
+            self.__leave_cell(unit)
+            unit.index = path[unit.path_position]
+            unit.steps += 1
+            self._mobile_cells[unit.player_index].setdefault(unit.index, []).append(unit)
+            if unit.index in EDGE_INDICES[unit.target_edge]:
+                self._breach(unit)
+
+    def _breach(self, unit):
+        self.result.breaches.append((unit.location, unit.unit_type, unit.player_index))
+        self.result.player_damage[1 - unit.player_index] += unit.breach_damage
+        self._unplace(unit)
+
+    def _self_destruct(self, unit):
+        self.result.self_destructs.append((unit.location, unit.unit_type, unit.player_index))
+        if unit.steps >= unit.self_destruct_steps and unit.self_destruct_range > 0:
+            for target in self._units_in_range(unit.index, unit.self_destruct_range, 1 - unit.player_index):
+                if target.stationary:
+                    target.health -= unit.self_destruct_damage_f
+                    self.result.structure_damage[target.player_index] += unit.self_destruct_damage_f
+                else:
+                    target.health -= unit.self_destruct_damage_i
+        self._unplace(unit)
+
+    def _attack(self):
+        candidates = {}
+        for attacker in self.structures + self.mobile_units:
+            if attacker.damage_i <= 0 and attacker.damage_f <= 0:
+                continue
+            target = self._choose_target(attacker, candidates)
+            if target is None:
+                continue
+            if target.stationary:
+                target.health -= attacker.damage_f
+                self.result.structure_damage[target.player_index] += attacker.damage_f
+            else:
+                target.health -= attacker.damage_i
+
+    def _choose_target(self, attacker, candidates):
+        """Picks the target GameState.get_target would, among units that are still alive.
+        Units sharing a location share the candidate lists for the frame. Structures are only looked at
+        once no mobile unit in range is left alive, so the attacker retargets like the engine does.
+        """
+        key = (attacker.index, attacker.attackRange, attacker.player_index, attacker.damage_i > 0, attacker.damage_f > 0)
+        options = candidates.get(key)
+        if options is None:
+            mobile = self._target_options(attacker, structures=False) if attacker.damage_i > 0 else []
+            options = candidates[key] = [mobile, None]
+        target = self._closest_alive(options[0])
+        if target is None and attacker.damage_f > 0:
+            if options[1] is None:
+                options[1] = self._target_options(attacker, structures=True)
+            target = self._closest_alive(options[1])
+        return target
+
+    def _target_options(self, attacker, structures):
+        x, y = CELL_X[attacker.index], CELL_Y[attacker.index]
+        height = 1 if attacker.player_index == 0 else -1
+        found = self._units_in_range(attacker.index, attacker.attackRange, 1 - attacker.player_index,
+            structures=structures, mobile_units=not structures)
+        options = []
+        for unit in found:
+            ux, uy = CELL_X[unit.index], CELL_Y[unit.index]
+            distance = math.sqrt((ux - x) ** 2 + (uy - y) ** 2)
+            options.append((distance, height * uy, -abs(HALF_ARENA - 0.5 - ux), unit))
+        return options
+
+    def _closest_alive(self, options):
+        target = None
+        best = None
+        for distance, height, x_distance, unit in options:
+            if unit.health <= 0:
+                continue
+            rank = (distance, unit.health, height, x_distance)
+            if best is None or rank < best:
+                best = rank
+                target = unit
+        return target
+
+    def _remove_dead(self):
+        for unit in [unit for unit in self.structures + self.mobile_units if unit.health <= 0]:
+            self.result.destroyed.append((unit.location, unit.unit_type, unit.player_index))
+            self._unplace(unit)
@@ -1,7 +1,24 @@
 import unittest
 import json
+import io
+import sys
+import threading
+import time
 from .game_state import GameState
+from .algocore import AlgoCore
+from .util import read_turn_info, serialize_commands
 from .unit import GameUnit
+from .navigation import distance_field, repair_distance_field
+from .simulator import Simulator
+from .time_budget import TimeBudget
+from .bitboard import Bitboard
+from .search import Planner, Action, legal_actions, defense_evaluator, UNBUDGETED_ITERATIONS
+from .parallel import WorkerPool, pack_state, unpack_state
+
+def path_length(game_state, location):
+    # Used by test_worker_pool, workers need a function they can import
+    game_state.attempt_spawn("FF", [13, 12])
+    return len(game_state.find_path_to_edge(location))
 
 class BasicTests(unittest.TestCase):
 
@@ -215,6 +232,15 @@ class BasicTests(unittest.TestCase):
         self.assertEqual([("DF", 13, 6)], game._build_stack, "Build queue is wrong!")
         self.assertEqual([("SI", 13, 0), ("SI", 13, 0), ("SI", 13, 0)], game._deploy_stack, "Deploy queue is wrong!")
 
+    def test_bulk_spawning(self):
+        game = self.make_turn_0_map()
+        game.suppress_warnings(True)
+        self.assertEqual(5, game.attempt_spawn("PI", [13, 0], 1000), "Spawning should stop when MP runs out")
+        self.assertEqual(0, game.get_resource(game.MP), "All MP should be spent")
+        self.assertEqual(5, len(game.game_map[13, 0]), "Every spawned unit should be on the map")
+        self.assertEqual([("PI", 13, 0)] * 5, game._deploy_stack, "Deploy queue is wrong!")
+        self.assertEqual(1, game.attempt_spawn("DF", [[13, 6], [13, 6]], 3), "Only one structure fits on a location")
+
     def test_trivial_functions(self):
         game = self.make_turn_0_map()
 
@@ -235,11 +261,34 @@ class BasicTests(unittest.TestCase):
             game.game_map.add_unit("FF", [13,13])
         self.assertEqual(1, len(game.game_map[13,13]), "Towers seem to be stacking")
         
+    def test_blocked_map(self):
+        game = self.make_turn_0_map()
+        self.assertEqual(0, sum(game.game_map.blocked), "An empty map should not be blocked")
+        game.game_map.add_unit("PI", [13, 0])
+        self.assertFalse(game.contains_stationary_unit([13, 0]), "Mobile units do not block")
+        game.game_map.add_unit("DF", [13, 13], 1)
+        self.assertEqual(1, game.game_map.blocked[13 * 28 + 13], "Structures should be marked as blocked")
+        self.assertEqual("DF", game.contains_stationary_unit([13, 13]).unit_type, "Should find the structure")
+        game.game_map.remove_unit([13, 13])
+        self.assertFalse(game.contains_stationary_unit([13, 13]), "Removed structures should not block")
+        game.game_map.place_unit(GameUnit("FF", game.config, 0, None, 12, 12))
+        self.assertEqual("FF", game.contains_stationary_unit([12, 12]).unit_type, "Placed structures should block")
+
     def test_get_units_in_range(self):
         game = self.make_turn_0_map()
         self.assertEqual(1, len(game.game_map.get_locations_in_range([13,13], 0)), "We should be in 0 range of ourself")
         self.assertEqual(37, len(game.game_map.get_locations_in_range([13,13], 3.5)), "Wrong number of tiles in range")
 
+    def test_edges(self):
+        game = self.make_turn_0_map()
+        edges = game.game_map.get_edges()
+        self.assertEqual([[14, 27], [15, 26]], edges[game.game_map.TOP_RIGHT][:2], "Top right edge is wrong")
+        self.assertEqual([13, 0], edges[game.game_map.BOTTOM_LEFT][0], "Bottom left edge is wrong")
+        edges[0].clear()
+        self.assertEqual(14, len(game.game_map.get_edge_locations(game.game_map.TOP_RIGHT)), "Edges should not share state between calls")
+        self.assertEqual(True, game.can_spawn("PI", [0, 13]), "Should be able to spawn on the bottom left edge")
+        self.assertEqual(False, game.can_spawn("PI", [1, 13]), "Mobile units must spawn on an edge")
+
     def _test_get_attackers(self):
         game = self.make_turn_0_map()
         
@@ -256,6 +305,519 @@ class BasicTests(unittest.TestCase):
         game.game_map.add_unit("DF", [14,14], 1)
         self.assertEqual(3, len(game.get_attackers([13,13], 0)), "We should be in danger from 3 places")
 
+    def test_pathing(self):
+        game = self.make_turn_0_map()
+        path = game.find_path_to_edge([13, 0])
+        self.assertEqual([13, 0], path[0], "Path should start at the spawn location")
+        self.assertEqual([27, 14], path[-1], "Path should end on the top right edge")
+        self.assertEqual(29, len(path), "Path on an empty map has the wrong length")
+        for x in range(10, 18):
+            game.game_map.add_unit("FF", [x, 5])
+        path = game.find_path_to_edge([13, 0])
+        self.assertEqual([[16, 4], [17, 4], [18, 4], [18, 5]], path[7:11], "Path should walk around the wall")
+        self.assertEqual([27, 14], path[-1], "Path should still reach the edge")
+
+    def test_self_destruct_path(self):
+        game = self.make_turn_0_map()
+        for location in [[11, 0], [11, 1], [12, 1], [13, 1], [14, 1], [15, 1]]:
+            game.game_map.add_unit("FF", location)
+        self.assertEqual([[13, 0], [14, 0]], game.find_path_to_edge([13, 0]), "Unit should walk to the most ideal tile of its pocket")
+        self.assertEqual(None, game.find_path_to_edge([13, 1]), "Pathing from a blocked location should fail")
+
+    def test_path_cache_follows_map(self):
+        game = self.make_turn_0_map()
+        before = game.find_path_to_edge([13, 0])
+        self.assertEqual(before, game.find_path_to_edge([13, 0]), "Cached path should not change")
+        game.attempt_spawn("FF", [[14, 2]])
+        after = game.find_path_to_edge([13, 0])
+        self.assertNotIn([14, 2], after, "Path should avoid a newly spawned wall")
+        fresh = self.make_turn_0_map()
+        fresh.game_map.add_unit("FF", [14, 2])
+        self.assertEqual(fresh.find_path_to_edge([13, 0]), after, "Cached path differs from a fresh search")
+        game.game_map.remove_unit([14, 2])
+        self.assertEqual(before, game.find_path_to_edge([13, 0]), "Path should return once the wall is removed")
+
+    def test_find_paths(self):
+        game = self.make_turn_0_map()
+        for x in range(8, 20):
+            game.game_map.add_unit("FF", [x, 9])
+        game.game_map.add_unit("FF", [13, 0])
+        edges = game.game_map.get_edges()
+        starts = edges[game.game_map.BOTTOM_LEFT] + edges[game.game_map.BOTTOM_RIGHT]
+        paths = game.find_paths(starts)
+        self.assertEqual(len(starts), len(paths), "Should get one path per start location")
+        self.assertEqual(None, paths[0], "Blocked start locations should have no path")
+        for start, path in zip(starts, paths):
+            self.assertEqual(game.find_path_to_edge(start), path, "Batch path differs from find_path_to_edge at {}".format(start))
+
+        paths = game.find_paths(starts[1:3], game.game_map.TOP_LEFT, as_indices=True)
+        self.assertEqual([tuple(x * 28 + y for x, y in game.find_path_to_edge(start, game.game_map.TOP_LEFT)) for start in starts[1:3]], paths, "Index paths are wrong")
+
+    def test_repair_distance_field(self):
+        blocked = bytearray(28 * 28)
+        sources = tuple(x * 28 + 27 - (x - 14) for x in range(14, 28))
+        field = distance_field(blocked, sources)
+        for location in [[13, 13], [14, 13], [12, 13], [14, 14], [13, 13], [20, 7], [14, 13], [27, 14]]:
+            index = location[0] * 28 + location[1]
+            blocked[index] = not blocked[index]
+            repair_distance_field(field, blocked, index, sources)
+            self.assertEqual(distance_field(blocked, sources), field, "Repaired field differs after flipping {}".format(location))
+
+    def test_what_if_paths(self):
+        game = self.make_turn_0_map()
+        starts = game.game_map.get_edge_locations(game.game_map.BOTTOM_LEFT)
+        before = game.find_paths(starts)
+        for location in [[13, 5], [12, 6], [15, 9]]:
+            game.game_map.add_unit("FF", location)
+            fresh = self.make_turn_0_map()
+            fresh.game_map.add_unit("FF", location)
+            self.assertEqual(fresh.find_paths(starts), game.find_paths(starts), "Repaired paths differ with a wall at {}".format(location))
+            game.game_map.remove_unit(location)
+        self.assertEqual(before, game.find_paths(starts), "Paths should be restored once the candidate is removed")
+
+    def test_threat_map(self):
+        game = self.make_turn_0_map()
+        game.game_map.add_unit("DF", [12, 14], 1)
+        game.game_map.add_unit("DF", [13, 14], 1)
+        game.game_map.add_unit("DF", [14, 14], 0)
+        game.contains_stationary_unit([13, 14]).upgrade()
+        threat = game.threat_map(0)
+        for location in [[13, 13], [12, 12], [10, 10], [13, 11]]:
+            self.assertEqual(len(game.get_attackers(location, 0)), threat.attackers[location[0]][location[1]], "Wrong attacker count at {}".format(location))
+        self.assertEqual(20, threat.damage[13][13], "Both enemy turrets should hit [13, 13]")
+        self.assertEqual(1, threat.upgraded_attackers[13][13], "One of the turrets is upgraded")
+        self.assertIs(threat, game.threat_map(0), "Threat map should be reused while the map is unchanged")
+        game.game_map.remove_unit([12, 14])
+        self.assertEqual(15, game.threat_map(0).damage[13][13], "Threat map should follow the map")
+        path = game.find_path_to_edge([13, 0])
+        self.assertEqual(sum(len(game.get_attackers(location, 0)) for location in path), game.threat_map(0).path_attackers(path), "Path attackers are wrong")
+
+    def test_simulator(self):
+        game = self.make_turn_0_map()
+        simulator = Simulator(game)
+        simulator.add_unit("PI", [13, 0], 0, 5)
+        result = simulator.run()
+        self.assertEqual(5, len(result.breaches), "Scouts on an empty board should all breach")
+        self.assertEqual(5, result.player_damage[1], "Each breach should cost the enemy health")
+        self.assertEqual([], result.survivors, "No units should be left once they breached")
+        self.assertEqual([], game.game_map[13, 0], "Simulating should not change the game state")
+
+        game.game_map.add_unit("DF", [13, 3], 1)
+        simulator = Simulator(game)
+        simulator.add_unit("PI", [13, 0], 0, 1)
+        result = simulator.run()
+        self.assertEqual([], result.breaches, "A lone scout should not get past a turret")
+        self.assertEqual(([14, 2], "PI", 0), result.destroyed[0], "Three turret shots should destroy the scout")
+        self.assertEqual(6, result.structure_damage[1], "The scout should hit the turret every frame it is alive")
+
+        game = self.make_turn_0_map()
+        game.game_map.add_unit("PI", [13, 2], 1)
+        game.game_map[13, 2][0].health = 1
+        game.game_map.add_unit("FF", [14, 2], 1)
+        simulator = Simulator(game)
+        simulator.add_unit("PI", [13, 0], 0, 2)
+        simulator._attack()
+        self.assertEqual(2, simulator.result.structure_damage[1], "The second scout should retarget the wall once the enemy scout is dead")
+
+    def test_fork(self):
+        game = self.make_turn_0_map()
+        game.game_map.add_unit("DF", [13, 10], 0)
+        game.game_map.add_unit("PI", [13, 0], 0)
+        child = game.fork()
+        self.assertIs(game.game_map[13, 10][0], child.game_map[13, 10][0], "Forks should share untouched units")
+
+        child.attempt_upgrade([13, 10])
+        child.attempt_spawn("PI", [13, 0])
+        child.attempt_spawn("FF", [14, 2])
+        self.assertTrue(child.contains_stationary_unit([13, 10]).upgraded, "The fork should see its own upgrade")
+        self.assertFalse(game.contains_stationary_unit([13, 10]).upgraded, "Upgrading in a fork should not change the parent")
+        self.assertEqual(1, len(game.game_map[13, 0]), "Spawning in a fork should not change the parent")
+        self.assertEqual(2, len(child.game_map[13, 0]), "The fork should see its own spawn")
+        self.assertFalse(game.contains_stationary_unit([14, 2]), "Building in a fork should not block the parent")
+        self.assertEqual([], game._build_stack, "The fork should have its own build stack")
+        self.assertNotEqual(game.get_resources(), child.get_resources(), "The fork should have its own resources")
+
+        game.game_map.remove_unit([13, 10])
+        self.assertTrue(child.contains_stationary_unit([13, 10]), "Changing the parent should not change the fork")
+        self.assertNotEqual(game.find_path_to_edge([13, 0]), child.find_path_to_edge([13, 0]), "Paths should follow each state's own map")
+
+    def test_unit_stats(self):
+        game = self.make_turn_0_map()
+        game.game_map.add_unit("DF", [13, 10], 0)
+        game.game_map.add_unit("DF", [14, 10], 0)
+        first, second = game.game_map[13, 10][0], game.game_map[14, 10][0]
+        self.assertIs(first.stats, second.stats, "Units of one type should share their stats")
+        first.upgrade()
+        self.assertEqual((3.5, 15, 90, True), (first.attackRange, first.damage_i, first.max_health, first.upgraded), "Upgrade stats are wrong")
+        self.assertEqual(2.5, second.attackRange, "Upgrading one unit should not change the others")
+        self.assertEqual([6, 0], first.cost, "Upgraded cost should include the upgrade")
+
+        table = game.game_map.get_unit_table()
+        self.assertEqual(2, len(table), "The table should hold every unit")
+        self.assertEqual([13, 14], list(table.x), "The table should be in location order")
+        self.assertEqual([1, 0], list(table.upgraded), "The table should show upgrades")
+        game.game_map.add_unit("PI", [13, 0], 1)
+        self.assertEqual([3, 2, 2], list(game.game_map.get_unit_table().unit_type), "The table should follow the map")
+
+    def test_decoded_state(self):
+        game = self.make_turn_0_map()
+        state = json.loads(game.serialized_string)
+        state["p1Units"][2].append([13, 10, 75.0, "1"])
+        decoded = GameState(game.config, state)
+        encoded = GameState(game.config, json.dumps(state))
+        self.assertEqual(str(encoded.game_map[13, 10]), str(decoded.game_map[13, 10]), "A decoded state should parse like its json string")
+        self.assertEqual(encoded.get_resources(), decoded.get_resources(), "A decoded state should parse like its json string")
+        self.assertEqual([1, 3, 7], read_turn_info('{"p2Units":[[],[]],"turnInfo":[1,3,7],"events":{}}'), "turnInfo was read wrong")
+        self.assertIsNone(read_turn_info('{"replaySave":1}'), "Messages without turnInfo have no turn info")
+
+    def test_message_dispatch(self):
+        class Recorder(AlgoCore):
+            def __init__(self):
+                super().__init__()
+                self.calls = []
+            def on_turn(self, state):
+                self.calls.append(("turn", state["turnInfo"][1]))
+            def on_action_frame(self, state):
+                self.calls.append(("frame", state["turnInfo"][2]))
+
+        lines = ['{"replaySave":0,"unitInformation":[]}', '{"turnInfo":[0,1,-1]}', '{"turnInfo":[1,1,0]}', '{"turnInfo":[1,1,1]}', '{"turnInfo":[2,1,2]}']
+        algo = Recorder()
+        stdin, stderr = sys.stdin, sys.stderr
+        sys.stdin, sys.stderr = io.StringIO("\n".join(lines) + "\n"), io.StringIO()
+        try:
+            algo.start()
+        finally:
+            sys.stdin, sys.stderr = stdin, stderr
+        self.assertEqual({"replaySave": 0, "unitInformation": []}, algo.config, "The config should be passed to on_game_start")
+        self.assertEqual([("turn", 1), ("frame", 0), ("frame", 1)], algo.calls, "Messages were dispatched wrong")
+
+    def test_frame_subscription(self):
+        class Recorder(AlgoCore):
+            def __init__(self):
+                super().__init__()
+                self.calls = []
+                self.subscribe_action_frames(first=True, last=True, events=["breach"])
+            def on_turn(self, state):
+                self.calls.append(("turn", state["turnInfo"][1]))
+            def on_action_frame(self, state):
+                self.calls.append(("frame", state["turnInfo"][2]))
+            def on_action_summary(self, summary):
+                self.calls.append(("summary", summary))
+
+        frame = '{{"turnInfo":[1,1,{}],"events":{{"breach":{},"death":[[[1,2],0,"3",4,false]]}}}}'
+        lines = ['{"turnInfo":[0,1,-1]}', frame.format(0, "[]"), frame.format(1, "[]"), frame.format(2, '[[[13,27],1,3,"5",1]]'),
+                 frame.format(3, "[]"), frame.format(4, "[]"), '{"turnInfo":[0,2,-1]}', '{"turnInfo":[2,2,-1]}']
+        algo = Recorder()
+        stdin, stderr = sys.stdin, sys.stderr
+        sys.stdin, sys.stderr = io.StringIO("\n".join(lines) + "\n"), io.StringIO()
+        try:
+            algo.start()
+        finally:
+            sys.stdin, sys.stderr = stdin, stderr
+        summary = {"turn": 1, "frames": 5, "events": {"breach": [[[13, 27], 1, 3, "5", 1]]}}
+        self.assertEqual([("turn", 1), ("frame", 0), ("frame", 2), ("frame", 4), ("summary", summary), ("turn", 2)], algo.calls, "Subscribed frames were dispatched wrong")
+
+    def test_precompute(self):
+        class Precomputer(AlgoCore):
+            def on_precompute(self, predicted_state):
+                predicted_state.attempt_spawn("DF", [13, 10])
+                return predicted_state.threat_map(1)
+
+        game = self.make_turn_0_map()
+        algo = Precomputer()
+        self.assertIsNone(algo.get_precomputed(game), "Nothing was precomputed yet")
+        self.assertTrue(algo.start_precompute(game), "The worker should start")
+        threat = algo.get_precomputed(game, timeout=5)
+        self.assertIsNotNone(threat, "The result should be ready for an unchanged board")
+        self.assertFalse(game.contains_stationary_unit([13, 10]), "The worker should not change the state it was given")
+        game.game_map.add_unit("FF", [3, 12], 1)
+        self.assertIsNone(algo.get_precomputed(game), "The result should be stale once structures change")
+
+    def test_time_budget(self):
+        game = self.make_turn_0_map()
+        budget = TimeBudget(game.config)
+        self.assertEqual((5, 35), (budget.soft_limit, budget.hard_limit), "Limits should be read from the config in seconds")
+        self.assertFalse(budget.should_stop(), "A new budget should have time left")
+
+        budget = TimeBudget({"timingAndReplay": {"waitTimeBotSoft": 50, "waitTimeBotMax": 100}}, margin=0)
+        rounds = list(budget.rounds())
+        self.assertTrue(len(rounds) > 0 and budget.remaining() < 0.05, "Rounds should run until close to the soft limit")
+        self.assertEqual([0, 1, 2], list(TimeBudget(game.config).rounds(3)), "Rounds should stop at max_rounds")
+
+        game.attempt_spawn("PI", [13, 0])
+        stdout, stderr = sys.stdout, sys.stderr
+        sys.stdout, sys.stderr = io.StringIO(), io.StringIO()
+        TimeBudget.current = budget = TimeBudget({"timingAndReplay": {"waitTimeBotMax": 10}}, margin=0)
+        try:
+            seen = []
+            thread = threading.Thread(target=lambda: seen.append(TimeBudget.current))
+            thread.start()
+            thread.join()
+            self.assertEqual([None], seen, "Other threads should not see the budget of the turn")
+            budget.keep_best(game.fork())
+            budget.start_watchdog()
+            while not budget.submitted and budget.elapsed() < 5:
+                pass
+            game.submit_turn()
+            output = sys.stdout.getvalue()
+        finally:
+            budget.stop()
+            TimeBudget.current = None
+            sys.stdout, sys.stderr = stdout, stderr
+        self.assertEqual('[]\n[["PI",13,0]]\n', output, "The best plan should be submitted once when time runs out")
+
+        sys.stdout, sys.stderr = io.StringIO(), io.StringIO()
+        TimeBudget.current = budget = TimeBudget({"timingAndReplay": {"waitTimeBotMax": 20}}, margin=0)
+        try:
+            budget.keep_best(game.fork())
+            budget.start_watchdog()
+            game.submit_turn()
+            # The turn ends without stopping the watchdog, like a timer that already fired when stop() is called
+            TimeBudget.current = None
+            time.sleep(0.05)
+            thread = threading.Thread(target=game.submit_turn)
+            thread.start()
+            thread.join()
+            output = sys.stdout.getvalue()
+        finally:
+            budget.stop()
+            TimeBudget.current = None
+            sys.stdout, sys.stderr = stdout, stderr
+        self.assertEqual('[]\n[["PI",13,0]]\n', output, "Neither the watchdog nor a background thread should submit the turn again")
+
+    def test_serialize_commands(self):
+        commands = [("DF", 13, 6), ("PI", 13, 0), ("PI", 13, 0), ("PI", 13, 0), ("EI", 14, 0), ("PI", 13, 0)]
+        self.assertEqual(json.loads(json.dumps(commands)), json.loads(serialize_commands(commands)), "Commands should serialize like json.dumps")
+        self.assertEqual("[]", serialize_commands([]), "An empty stack should be an empty array")
+
+    def test_query_cache(self):
+        game = self.make_turn_0_map()
+        game.game_map.add_unit("DF", [13, 14], 1)
+        attackers = game.get_attackers([13, 12], 0)
+        attackers.clear()
+        self.assertEqual(1, len(game.get_attackers([13, 12], 0)), "Changing a returned list should not change the cache")
+        self.assertEqual({"hits": 1, "misses": 1}, game.cache_stats()["get_attackers"], "The second query should be a hit")
+        game.game_map.add_unit("DF", [12, 14], 1)
+        self.assertEqual(2, len(game.get_attackers([13, 12], 0)), "The cache should follow the map")
+        self.assertEqual(5, game.number_affordable("PI"), "I should afford 5 scouts")
+        game.attempt_spawn("PI", [13, 0])
+        self.assertEqual(4, game.number_affordable("PI"), "The cache should follow resources")
+
+        game.game_map.add_unit("DF", [3, 14], 1)
+        probe = GameUnit("PI", game.config, 0, None, 3, 12)
+        self.assertEqual([3, 14], [game.get_target(probe).x, game.get_target(probe).y], "The probe should target the nearby turret")
+        probe.x = 24
+        self.assertIsNone(game.get_target(probe), "Moving a unit in place should change its target")
+        game.game_map.add_unit("FF", [20, 14], 1)
+        game.game_map.add_unit("FF", [22, 14], 1)
+        probe.x, probe.y = 21, 13
+        self.assertEqual([22, 14], [game.get_target(probe).x, game.get_target(probe).y], "Ties should go to the target closest to the edge")
+        game.game_map[20, 14][0].health = 1
+        self.assertEqual([20, 14], [game.get_target(probe).x, game.get_target(probe).y], "Lowering a unit's health in place should change the target")
+        self.assertIs(game.resolve_targets([probe])[0], game.get_target(probe), "get_target should agree with resolve_targets")
+
+    def test_bitboard(self):
+        game = self.make_turn_0_map()
+        game.game_map.add_unit("DF", [13, 14], 1)
+        game.game_map.add_unit("DF", [5, 16], 1)
+        game.game_map.add_unit("FF", [6, 16], 1)
+        game.game_map.add_unit("FF", [13, 10], 0)
+        game.game_map.add_unit("PI", [13, 0], 1)
+
+        turrets = Bitboard.from_game_map(game.game_map, 1, "DF")
+        self.assertEqual([[5, 16], [13, 14]], turrets.to_locations(), "Enemy turrets are wrong")
+        self.assertEqual(4, len(Bitboard.from_game_map(game.game_map, stationary=True)), "Structures are wrong")
+        self.assertEqual([[13, 0]], list(Bitboard.from_game_map(game.game_map, stationary=False)), "Mobile units are wrong")
+        self.assertEqual(420, len(Bitboard.arena()), "The arena has 420 locations")
+        self.assertEqual(420, len(~Bitboard()), "The complement should stay inside the arena")
+
+        covered = turrets.dilate(2.5, 0.01)
+        expected = set()
+        for location in turrets:
+            expected.update(tuple(covered_location) for covered_location in game.game_map.get_locations_in_range(location, 2.5))
+        self.assertEqual(expected, set(tuple(location) for location in covered), "Dilation should match get_locations_in_range")
+
+        path = game.find_path_to_edge([13, 0])
+        self.assertEqual(Bitboard.from_locations(path), Bitboard.from_locations(game.find_paths([[13, 0]], as_indices=True)[0]), "Indices and locations should agree")
+        self.assertIn(path[-1], Bitboard.edge(game.game_map.TOP_RIGHT), "The path should end on its edge")
+        self.assertEqual([[4, 16]], (Bitboard.from_locations([[5, 16]]).shift(-1, 0)).to_locations(), "Shift is wrong")
+        self.assertEqual([], Bitboard.from_locations([[0, 13]]).shift(-1, 0).to_locations(), "Shifting off the arena should drop the location")
+        self.assertEqual([[5, 16]], (turrets & Bitboard.columns(range(7)) - Bitboard.rows([14])).to_locations(), "Row and column masks are wrong")
+        self.assertEqual(Bitboard.columns([5]), Bitboard.columns([-23, 5, 28]), "Columns outside the board should be skipped")
+        self.assertEqual(Bitboard.rows([16]), Bitboard.rows([-12, 16, 40]), "Rows outside the board should be skipped")
+
+    def test_map_iteration(self):
+        game = self.make_turn_0_map()
+        locations = list(game.game_map)
+        self.assertEqual(420, len(locations), "The arena has 420 locations")
+        self.assertEqual([[13, 0], [14, 0], [12, 1]], locations[:3], "Locations should go row by row from the bottom")
+        self.assertEqual([14, 27], locations[-1], "The last location should be the top corner")
+        self.assertEqual(420 * 420, sum(1 for _ in game.game_map for _ in game.game_map), "Nested iteration should visit every pair")
+        self.assertEqual(210, len(game.game_map.get_locations(player_index=1)), "Each half has 210 locations")
+        self.assertTrue(all(x < 14 and y < 14 for x, y in game.game_map.get_locations(quadrant=game.game_map.BOTTOM_LEFT)), "The bottom left quadrant is wrong")
+
+        game.game_map.add_unit("DF", [13, 14], 1)
+        game.game_map.add_unit("PI", [13, 0], 0, 2)
+        game.game_map.add_unit("FF", [3, 13], 0)
+        game.game_map.remove_unit([3, 13])
+        self.assertEqual([[13, 0], [13, 0], [13, 14]], [[unit.x, unit.y] for unit in game.game_map.iter_units()], "iter_units should visit occupied locations in order")
+        self.assertEqual(["DF"], [unit.unit_type for unit in game.game_map.iter_units(stationary=True)], "iter_units should filter structures")
+        self.assertEqual([], list(game.game_map.iter_units(player_index=1, unit_types=["PI"])), "iter_units should filter players and types")
+
+    def test_unit_indexes(self):
+        game = self.make_turn_0_map()
+        game.game_map.add_unit("DF", [13, 14], 1)
+        game.game_map.add_unit("DF", [5, 16], 1)
+        game.game_map.add_unit("FF", [6, 16], 1)
+        game.game_map.add_unit("PI", [13, 0], 0, 3)
+        self.assertEqual([[13, 14], [5, 16]], [[unit.x, unit.y] for unit in game.units_of(1, "DF")], "Enemy turrets are wrong")
+        self.assertEqual(3, game.unit_totals(0, "PI")["count"], "Stacked units should each be counted")
+        self.assertEqual(3, game.unit_totals(1)["count"], "Enemy units are wrong")
+        self.assertEqual(2 * game.type_cost("DF")[0] + game.type_cost("FF")[0], game.structure_value(1), "Enemy structure value is wrong")
+
+        child = game.fork()
+        child.game_map.remove_unit([13, 14])
+        child.game_map.get_writable_units([5, 16])[0].upgrade()
+        upgraded_cost = child.game_map[5, 16][0].cost[0]
+        self.assertEqual(upgraded_cost + game.type_cost("FF")[0], child.structure_value(1), "Upgrades should be counted")
+        self.assertEqual(2 * game.type_cost("DF")[0] + game.type_cost("FF")[0], game.structure_value(1), "The parent should keep its indexes")
+        self.assertEqual(["FF"], [unit.unit_type for unit in child.units_of(1, "FF")], "Forks should keep their indexes")
+
+        all_units = list(game.game_map.iter_units())
+        self.assertEqual(all_units, game.units_of(), "Without filters every unit should be returned")
+        self.assertEqual(sum(unit.health for unit in all_units), game.unit_totals()["health"], "Total health is wrong")
+
+        game.game_map.get_writable_units([13, 14]).clear()
+        self.assertFalse(game.contains_stationary_unit([13, 14]), "Structures removed from a writable list should unblock their location")
+        self.assertEqual(0, game.game_map.blocked[13 * 28 + 14], "Structures removed from a writable list should unblock their location")
+        x, y = game.find_path_to_edge([13, 0])[3]
+        game.game_map.get_writable_units([x, y]).append(GameUnit("FF", game.config, 0, None, x, y))
+        self.assertIn([x, y], Bitboard.from_game_map(game.game_map, stationary=True), "Structures added to a writable list should block their location")
+        self.assertNotIn([x, y], game.find_path_to_edge([13, 0]), "Paths should go around structures added to a writable list")
+
+    def test_resolve_targets(self):
+        game = self.make_turn_0_map()
+        game.game_map.add_unit("DF", [13, 12], 0)
+        game.game_map.add_unit("DF", [12, 15], 1)
+        game.game_map.add_unit("FF", [13, 14], 1)
+        game.game_map.add_unit("FF", [15, 14], 1)
+        game.game_map.add_unit("PI", [12, 10], 1)
+        game.game_map.add_unit("PI", [14, 13], 0, 2)
+        game.game_map[15, 14][0].health = 10
+        attackers = list(game.game_map.iter_units())
+        targets = game.resolve_targets(attackers)
+        self.assertEqual([game.get_target(attacker) for attacker in attackers], targets, "Targets should match get_target")
+        target_of = dict(zip(map(id, attackers), targets))
+        self.assertEqual([12, 10], [target_of[id(game.game_map[13, 12][0])].x, target_of[id(game.game_map[13, 12][0])].y], "Mobile units should be targeted first")
+        self.assertEqual([15, 14], [target_of[id(game.game_map[14, 13][0])].x, target_of[id(game.game_map[14, 13][0])].y], "The damaged wall should be targeted")
+        self.assertIsNone(target_of[id(game.game_map[13, 14][0])], "Walls don't attack")
+
+    def test_planner(self):
+        game = self.make_turn_0_map()
+        actions = legal_actions(game, unit_types=["DF"])
+        self.assertEqual(210, len(actions), "A turret can go anywhere on my half")
+        self.assertFalse(Action("spawn", "DF", [13, 14]).is_legal(game), "Enemy territory is not legal")
+
+        candidates = [Action("spawn", "DF", [x, 13]) for x in range(1, 27, 5)] + [Action("upgrade", None, [11, 13])]
+        evaluator = defense_evaluator()
+        planner = Planner(game, evaluator, candidates=candidates)
+        empty_score = planner.best.score
+        plan = planner.beam_search(beam_width=2, max_depth=3)
+        self.assertGreater(plan.score, empty_score, "Turrets should improve the defense")
+        self.assertEqual(plan.score, evaluator(plan.game_state), "The plan's state should have its score")
+        self.assertEqual([], game._build_stack, "Searching should not change the state")
+        self.assertEqual(len(plan.actions), plan.apply(game), "The plan should apply to the searched state")
+
+        budget = TimeBudget(game.config)
+        budget.soft_limit = 0
+        planner = Planner(self.make_turn_0_map(), evaluator, candidates=candidates, time_budget=budget)
+        self.assertEqual([], planner.mcts(seed=0).actions, "An expired budget should return the best plan right away")
+        planner = Planner(self.make_turn_0_map(), evaluator, candidates=candidates)
+        TimeBudget.current = budget
+        try:
+            plan = planner.beam_search(beam_width=2, max_depth=3)
+        finally:
+            TimeBudget.current = None
+        self.assertEqual([], plan.actions, "The current budget should be read when the search starts")
+        plan = Planner(self.make_turn_0_map(), evaluator, candidates=candidates).mcts(max_depth=3, max_iterations=60, seed=0)
+        self.assertGreater(plan.score, empty_score, "MCTS should find turrets too")
+        planner = Planner(self.make_turn_0_map(), evaluator, candidates=candidates[:2])
+        planner.mcts(max_depth=1)
+        self.assertLessEqual(planner.evaluations, UNBUDGETED_ITERATIONS + 1, "MCTS without a budget or max_iterations should stop")
+
+    def test_worker_pool(self):
+        game = self.make_turn_0_map()
+        game.attempt_spawn("DF", [[13, 12], [3, 12]])
+        game.attempt_upgrade([3, 12])
+        game.game_map.add_unit("FF", [13, 16], 1)
+        game.attempt_spawn("PI", [14, 0], 2)
+        copy = unpack_state(game.config, pack_state(game))
+        describe = lambda state: [(unit.unit_type, unit.player_index, unit.x, unit.y, unit.health, unit.upgraded) for unit in state.game_map.iter_units()]
+        self.assertEqual(describe(game), describe(copy), "Unpacking should give the same units")
+        self.assertEqual(game.get_resources(), copy.get_resources(), "Unpacking should keep the resources")
+        self.assertEqual(game._build_stack + game._deploy_stack, copy._build_stack + copy._deploy_stack, "Unpacking should keep the stacks")
+
+        locations = [[x, 13 - x] for x in range(1, 14)]
+        expected = [path_length(game.fork(), location) for location in locations]
+        self.assertEqual(expected, AlgoCore().map_candidates(path_length, locations, game), "Without workers candidates are evaluated in process")
+        pool = WorkerPool(game.config, 2)
+        try:
+            self.assertEqual(expected, pool.map_candidates(path_length, locations, game, timeout=30), "Workers should match the serial results")
+        finally:
+            pool.close()
+        self.assertEqual(["FF"], [unit.unit_type for unit in game.game_map[13, 16]], "Candidates should not change the state")
+
+    def test_attack_estimator(self):
+        game = self.make_turn_0_map()
+        estimator = game.attack_estimator()
+        estimate = estimator.estimate([13, 0], "PI", 3)
+        self.assertEqual((3, 3, 0, 0), (estimate.survivors, estimate.breaches, estimate.structure_damage, estimate.damage_taken), "An open board should let every unit through")
+        self.assertIs(estimator, game.attack_estimator(), "The estimator should be kept while the map doesn't change")
+
+        game.game_map.add_unit("DF", [23, 14], 1)
+        game.game_map.add_unit("DF", [24, 15], 1)
+        estimator = game.attack_estimator()
+        path = game.find_path_to_edge([13, 0])
+        exposure = sum(game.threat_map(0).damage[x][y] for x, y in path[:-1])
+        estimate = estimator.estimate([13, 0], "PI", 3)
+        self.assertEqual(exposure, estimate.damage_taken, "A scout spends one frame on every location before its edge")
+        self.assertEqual(3 - int(exposure // 15), estimate.survivors, "Damage should kill one scout at a time")
+        self.assertGreater(estimate.structure_damage, 0, "Scouts should hit the turrets they pass")
+        slow = estimator.estimate([13, 0], "EI", 1)
+        self.assertEqual(0, slow.survivors, "Slow units spend longer in range")
+        self.assertEqual(exposure, estimate.exposure, "Survivors are exposed to all the damage along the path")
+        self.assertGreater(slow.exposure, slow.damage_taken, "Exposure should not be capped by the group's health")
+
+        simulated = Simulator(game)
+        simulated.add_unit("PI", [13, 0], 0, 3)
+        self.assertEqual(len(simulated.run().breaches), estimate.breaches, "The estimate should agree with the simulator")
+        self.assertIsNone(estimator.estimate([23, 14], "PI"), "Blocked locations have no path")
+        self.assertEqual([14, 0], estimator.best_location([[13, 0], [14, 0]], "PI", 3)[0], "The path away from the turrets should be best")
+
+    def test_path_results(self):
+        game = self.make_turn_0_map()
+        starts = [[13, 0], [14, 0], [3, 10]]
+        results = game.find_path_results(starts)
+        self.assertEqual(game.find_paths(starts), [result.path for result in results], "Results should hold the same paths as find_paths")
+        self.assertTrue(all(result.reached_edge for result in results), "An open board should let every unit reach its edge")
+        self.assertEqual(len(results[0].path) - 1, results[0].steps, "Steps should count the moves along the path")
+
+        game.game_map.add_unit("FF", [13, 1], 0)
+        game.game_map.add_unit("FF", [14, 1], 0)
+        trapped, free = game.find_path_results([[13, 0], [3, 10]])
+        self.assertFalse(trapped.reached_edge, "A walled off unit can't reach its edge")
+        self.assertEqual(trapped.path[-1], trapped.self_destruct_tile, "The unit should self destruct where its path ends")
+        self.assertEqual(2, trapped.pocket_size, "The walled off pocket holds [13, 0] and [14, 0]")
+        self.assertTrue(free.reached_edge, "Units outside the pocket should still reach their edge")
+        self.assertNotEqual(trapped.pocket, free.pocket, "Walled off locations should be in a different pocket")
+
+        pockets = game.pocket_map()
+        self.assertEqual(pockets[13 * 28], pockets[14 * 28], "Connected locations should share a pocket")
+        self.assertEqual(trapped.pocket, pockets[13 * 28], "The pocket map should agree with the path results")
+        self.assertEqual(-1, pockets[13 * 28 + 1], "Blocked locations have no pocket")
+        self.assertEqual(-1, pockets[0], "Locations outside the arena have no pocket")
+        self.assertIs(pockets, game.pocket_map(), "The pocket map should be kept while the structures don't change")
+
     def test_print_unit(self):
         game = self.make_turn_0_map()
 
@@ -0,0 +1,158 @@
+import math
+
+from .game_map import ARENA_SIZE, IN_ARENA
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+ARENA_CELLS = ARENA_SIZE * ARENA_SIZE
+
+_kernels = {}
+
+
+def attack_kernel(location, attack_range, search_range):
+    """The indices of every location a unit at the given location can attack
+
+    A location is attacked if it is within attack_range of the unit, and the unit is within
+    search_range (the largest attackRange in the config plus getHitRadius) of the location,
+    which is the area GameState.get_attackers searches. Kernels are cached per location and range.
+
+    Args:
+        location: The location of the attacking unit
+        attack_range: The attackRange of the attacking unit
+        search_range: The radius GameState.get_attackers searches around a location
+
+    Returns:
+        A tuple of x * ARENA_SIZE + y indices
+
+    """
+    x, y = location
+    key = (x, y, attack_range, search_range)
+    kernel = _kernels.get(key)
+    if kernel is None:
+        reach = math.ceil(max(attack_range, 0))
+        cells = []
+        for i in range(x - reach, x + reach + 1):
+            for j in range(y - reach, y + reach + 1):
+                if not (0 <= i < ARENA_SIZE and 0 <= j < ARENA_SIZE and IN_ARENA[i * ARENA_SIZE + j]):
+                    continue
+                distance = math.sqrt((x - i) ** 2 + (y - j) ** 2)
+                if distance <= attack_range and distance < search_range:
+                    cells.append(i * ARENA_SIZE + j)
+        kernel = tuple(cells)
+        if np is not None:
+            kernel = np.array(kernel, dtype=np.intp)
+        _kernels[key] = kernel
+    return kernel
+
+
+class ThreatMap:
+    """The threat every location is under from the units of one player's opponent.
+    Built in a single pass by stamping the attack area of every attacker onto the map,
+    so checking a whole path costs a handful of lookups instead of a get_attackers call per location.
+
+    The arrays are numpy arrays of shape (ARENA_SIZE, ARENA_SIZE) when numpy is installed, lists of ARENA_SIZE lists otherwise.
+    Either way, threat_map.damage[x][y] is the value at location [x, y].
+
+    Attributes :
+        * player_index (int): The player whose units are threatened, 0 for you 1 for the enemy
+        * damage (array): The damage per frame a mobile unit of player_index takes at each location
+        * attackers (array): The number of units attacking each location, len(game_state.get_attackers(location, player_index))
+        * upgraded_attackers (array): The number of upgraded units attacking each location
+
+    """
+    def __init__(self, game_state, player_index):
+        """Builds the threat map from the units on the game_state's map
+
+        Args:
+            game_state: The GameState to read units from
+            player_index: The player whose units are threatened, 0 for you 1 for the enemy
+
+        """
+        self.player_index = player_index
+        search_range = 0
+        for unit in game_state.config["unitInformation"]:
+            if unit.get('attackRange', 0) >= search_range:
+                search_range = unit.get('attackRange', 0)
+        search_range += game_state.config["unitInformation"][0]['getHitRadius']
+
+        if np is not None:
+            damage = np.zeros(ARENA_CELLS)
+            attackers = np.zeros(ARENA_CELLS, dtype=np.int32)
+            upgraded_attackers = np.zeros(ARENA_CELLS, dtype=np.int32)
+        else:
+            damage = [0] * ARENA_CELLS
+            attackers = [0] * ARENA_CELLS
+            upgraded_attackers = [0] * ARENA_CELLS
+
+        for unit in game_state.game_map.iter_units(player_index=1 - player_index):
+            if unit.damage_i + unit.damage_f <= 0:
+                continue
+            kernel = attack_kernel((int(unit.x), int(unit.y)), unit.attackRange, search_range)
+            if np is not None:
+                damage[kernel] += unit.damage_i
+                attackers[kernel] += 1
+                if unit.upgraded:
+                    upgraded_attackers[kernel] += 1
+            else:
+                for index in kernel:
+                    damage[index] += unit.damage_i
+                    attackers[index] += 1
+                    if unit.upgraded:
+                        upgraded_attackers[index] += 1
+
+        self._flat_damage = damage
+        self._flat_attackers = attackers
+        self._flat_upgraded_attackers = upgraded_attackers
+        if np is not None:
+            self.damage = damage.reshape(ARENA_SIZE, ARENA_SIZE)
+            self.attackers = attackers.reshape(ARENA_SIZE, ARENA_SIZE)
+            self.upgraded_attackers = upgraded_attackers.reshape(ARENA_SIZE, ARENA_SIZE)
+        else:
+            self.damage = [damage[x * ARENA_SIZE:(x + 1) * ARENA_SIZE] for x in range(ARENA_SIZE)]
+            self.attackers = [attackers[x * ARENA_SIZE:(x + 1) * ARENA_SIZE] for x in range(ARENA_SIZE)]
+            self.upgraded_attackers = [upgraded_attackers[x * ARENA_SIZE:(x + 1) * ARENA_SIZE] for x in range(ARENA_SIZE)]
+
+    def flat_damage(self):
+        """The damage per frame at every location in a flat array, for walking paths of location indices without converting them
+
+        Returns:
+            The damage array indexed by x * ARENA_SIZE + y. It is shared with the threat map, so don't change it
+
+        """
+        return self._flat_damage
+
+    def path_damage(self, path):
+        """The damage per frame summed over every location of a path
+
+        Args:
+            path: A list of locations, or a tuple of location indices as returned by GameState.find_paths(..., as_indices=True)
+
+        Returns:
+            The total damage per frame
+
+        """
+        return self.__gather(self._flat_damage, path)
+
+    def path_attackers(self, path):
+        """The number of attackers summed over every location of a path
+
+        Args:
+            path: A list of locations, or a tuple of location indices as returned by GameState.find_paths(..., as_indices=True)
+
+        Returns:
+            The total number of attackers
+
+        """
+        return self.__gather(self._flat_attackers, path)
+
+    def __gather(self, values, path):
+        if not path:
+            return 0
+        if type(path[0]) is not int:
+            path = [x * ARENA_SIZE + y for x, y in path]
+        if np is not None:
+            return values[list(path)].sum().item()
+        return sum(values[index] for index in path)
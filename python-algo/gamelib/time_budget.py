@@ -0,0 +1,137 @@
+import threading
+import time
+
+from .util import debug_write, send_commands, serialize_commands
+
+_local = threading.local()
+
+
+class _CurrentBudget(type):
+    # TimeBudget.current is kept per thread, so background threads such as on_precompute never pick up the budget of a turn
+    @property
+    def current(cls):
+        return getattr(_local, "current", None)
+
+    @current.setter
+    def current(cls, budget):
+        _local.current = budget
+
+
+class TimeBudget(metaclass=_CurrentBudget):
+    """Keeps track of how much time is left to submit the current turn.
+    AlgoCore starts one as soon as a turn message is read, so the time spent decoding the message is included,
+    and makes it available to on_turn as self.time_budget.
+
+    If a best plan is set with keep_best, the budget submits it on its own when the hard limit is about to run out,
+    and any later submit_turn call for the same turn is ignored.
+
+    Attributes :
+        * current (TimeBudget): The budget of the turn being played on this thread, None between turns and on other threads. Used by GameState.submit_turn
+        * soft_limit (float): Seconds after the start of the turn after which the engine starts penalizing the algo
+        * hard_limit (float): Seconds after the start of the turn after which the engine stops waiting for the algo
+        * margin (float): Seconds kept in reserve before each limit
+        * start (float): The time.perf_counter() value the turn started at
+        * submitted (bool): If the turn has been submitted
+
+    """
+    def __init__(self, config, start=None, margin=0.25):
+        """Reads the limits from the config
+
+        Args:
+            config: A json object containing information about the game
+            start: The time.perf_counter() value the turn started at, now if None
+            margin: Seconds kept in reserve before each limit
+
+        """
+        timing = config.get("timingAndReplay", {})
+        soft_limits = [timing[key] for key in ("waitTimeBotSoft", "playWaitTimeBotSoft") if key in timing]
+        hard_limits = [timing[key] for key in ("waitTimeBotMax", "playWaitTimeBotMax") if key in timing]
+        # The limits are in milliseconds. The stricter of the match and play limits is used
+        self.hard_limit = min(hard_limits) / 1000 if hard_limits else 35.0
+        self.soft_limit = min(min(soft_limits) / 1000, self.hard_limit) if soft_limits else self.hard_limit
+        self.margin = margin
+        self.start = time.perf_counter() if start is None else start
+        self.submitted = False
+        self.__best = None
+        self.__lock = threading.Lock()
+        self.__watchdog = None
+
+    def elapsed(self):
+        """The number of seconds since the turn started
+        """
+        return time.perf_counter() - self.start
+
+    def remaining(self, hard=False):
+        """The number of seconds left before the soft limit, or the hard limit if hard is True, minus the margin.
+        Negative once the limit has passed.
+        """
+        limit = self.hard_limit if hard else self.soft_limit
+        return limit - self.margin - self.elapsed()
+
+    def should_stop(self):
+        """True once there is no time left before the soft limit
+        """
+        return self.remaining() <= 0
+
+    def rounds(self, max_rounds=None):
+        """Yields round numbers, 0, 1, 2, ..., for as long as another round is expected to finish before the soft limit.
+        The longest round so far is used as the estimate, which suits anytime searches that refine a plan each round.
+
+        Args:
+            max_rounds: The most rounds to yield, no maximum if None
+
+        """
+        round_number = 0
+        longest = 0
+        while max_rounds is None or round_number < max_rounds:
+            if self.remaining() <= longest:
+                return
+            round_start = time.perf_counter()
+            yield round_number
+            longest = max(longest, time.perf_counter() - round_start)
+            round_number += 1
+
+    def keep_best(self, game_state):
+        """Sets the plan to submit if the hard limit is about to run out before the turn is submitted.
+        Pass a GameState that is no longer being changed, such as a fork.
+
+        Args:
+            game_state: The GameState holding the best plan found so far
+
+        """
+        self.__best = game_state
+
+    def claim_submission(self):
+        """Marks the turn as submitted. Used by GameState.submit_turn so a turn is only submitted once.
+
+        Returns:
+            True if the caller should submit the turn, False if it was already submitted
+
+        """
+        with self.__lock:
+            if self.submitted:
+                return False
+            self.submitted = True
+            return True
+
+    def start_watchdog(self):
+        """Starts a timer that submits the plan from keep_best just before the hard limit
+        """
+        self.__watchdog = threading.Timer(max(self.remaining(hard=True), 0), self.__force_submit)
+        self.__watchdog.daemon = True
+        self.__watchdog.start()
+
+    def stop(self):
+        """Stops the watchdog timer
+        """
+        if self.__watchdog is not None:
+            self.__watchdog.cancel()
+            self.__watchdog = None
+
+    def __force_submit(self):
+        # The timer can fire after stop() if it was already running, so the claim is what keeps a turn from being sent twice
+        best = self.__best
+        if best is None or not self.claim_submission():
+            return
+        debug_write("Running out of time after {:.2f}s, submitting the best plan found so far".format(self.elapsed()))
+        send_commands(serialize_commands(best._build_stack), serialize_commands(best._deploy_stack))
@@ -9,9 +9,94 @@ def is_stationary(unit_type, structure_types):
     return unit_type in structure_types
 
 
+_STAT_KEYS = (
+    ("speed", "speed"),
+    ("damage_f", "attackDamageTower"),
+    ("damage_i", "attackDamageWalker"),
+    ("attackRange", "attackRange"),
+    ("shieldRange", "shieldRange"),
+    ("max_health", "startHealth"),
+    ("shieldPerUnit", "shieldPerUnit"),
+)
+
+# id(config) -> (config, {unit_type: UnitStats}). The config is kept so its id can not be reused.
+_stats_by_config = {}
+
+
+class UnitStats:
+    """The stats shared by every unit of one type, read from the config once.
+
+    Attributes :
+        * unit_type (string): The unit type these stats belong to
+        * type_index (int): The index of the unit type in config["unitInformation"]
+        * config (JSON): Contains information about the game
+        * stationary, speed, damage_f, damage_i, attackRange, shieldRange, max_health, shieldPerUnit, cost: See GameUnit
+
+    """
+    __slots__ = ("unit_type", "type_index", "config", "stationary", "speed", "damage_f", "damage_i", "attackRange",
+        "shieldRange", "max_health", "shieldPerUnit", "cost", "__upgraded")
+
+    def __init__(self, unit_type, type_index, config):
+        type_config = config["unitInformation"][type_index]
+        self.unit_type = unit_type
+        self.type_index = type_index
+        self.config = config
+        self.stationary = type_config["unitCategory"] == 0
+        for attribute, key in _STAT_KEYS:
+            setattr(self, attribute, type_config.get(key, 0))
+        self.cost = (type_config.get("cost1", 0), type_config.get("cost2", 0))
+        self.__upgraded = None
+
+    def upgraded(self):
+        """The stats of this unit type after an upgrade, built once and shared
+
+        Returns:
+            A UnitStats with the config's upgrade values applied on top of these stats
+
+        """
+        if self.__upgraded is None:
+            upgrade = self.config["unitInformation"][self.type_index].get("upgrade", {})
+            stats = object.__new__(UnitStats)
+            stats.unit_type = self.unit_type
+            stats.type_index = self.type_index
+            stats.config = self.config
+            stats.stationary = self.stationary
+            for attribute, key in _STAT_KEYS:
+                setattr(stats, attribute, upgrade.get(key, getattr(self, attribute)))
+            stats.cost = (upgrade.get("cost1", 0) + self.cost[0], upgrade.get("cost2", 0) + self.cost[1])
+            stats.__upgraded = None
+            self.__upgraded = stats
+        return self.__upgraded
+
+
+def unit_stats(config, unit_type):
+    """Gets the shared UnitStats of a unit type, resolving every unit type of the config the first time it is seen
+
+    Args:
+        config (JSON): Contains information about the game
+        unit_type: The shorthand of a unit type
+
+    Returns:
+        The UnitStats for unit_type
+
+    """
+    entry = _stats_by_config.get(id(config))
+    if entry is None:
+        stats = {}
+        for index, type_config in enumerate(config["unitInformation"]):
+            if "shorthand" in type_config and "unitCategory" in type_config:
+                stats[type_config["shorthand"]] = UnitStats(type_config["shorthand"], index, config)
+        entry = (config, stats)
+        _stats_by_config[id(config)] = entry
+    return entry[1][unit_type]
+
+
 class GameUnit:
     """Holds information about a Unit. 
 
+    The stats of a unit come from a UnitStats record shared by every unit of the same type,
+    so they can be read like normal attributes but not assigned to.
+
     Attributes :
         * unit_type (string): This unit's type
         * config (JSON): Contains information about the game
@@ -30,49 +115,79 @@ class GameUnit:
         * shieldPerUnit (float): how much shield is given per unit
         * pending_removal (boolean): If this unit is marked for removal by its owner
         * upgraded (boolean): If this unit is upgraded
+        * stats (UnitStats): The shared stat record of this unit
 
     """
+    __slots__ = ("unit_type", "player_index", "pending_removal", "upgraded", "x", "y", "health", "stats")
+
     def __init__(self, unit_type, config, player_index=None, health=None, x=-1, y=-1):
         """ Initialize unit variables using args passed
 
         """
         self.unit_type = unit_type
-        self.config = config
         self.player_index = player_index
         self.pending_removal = False
         self.upgraded = False
         self.x = x
         self.y = y
-        self.__serialize_type()
-        self.health = self.max_health if not health else health
+        self.stats = unit_stats(config, unit_type)
+        self.health = self.stats.max_health if not health else health
 
-    def __serialize_type(self):
-        from .game_state import STRUCTURE_TYPES, UNIT_TYPE_TO_INDEX, FACTORY
-        type_config = self.config["unitInformation"][UNIT_TYPE_TO_INDEX[self.unit_type]]
-        self.stationary = type_config["unitCategory"] == 0
-        self.speed = type_config.get("speed", 0)
-        self.damage_f = type_config.get("attackDamageTower", 0)
-        self.damage_i = type_config.get("attackDamageWalker", 0)
-        self.attackRange = type_config.get("attackRange", 0)
-        self.shieldRange = type_config.get("shieldRange", 0)
-        self.max_health = type_config.get("startHealth", 0)
-        self.shieldPerUnit = type_config.get("shieldPerUnit", 0)
-        self.cost = [type_config.get("cost1", 0), type_config.get("cost2", 0)]
+    @property
+    def config(self):
+        return self.stats.config
 
+    @property
+    def stationary(self):
+        return self.stats.stationary
+
+    @property
+    def speed(self):
+        return self.stats.speed
+
+    @property
+    def damage_f(self):
+        return self.stats.damage_f
+
+    @property
+    def damage_i(self):
+        return self.stats.damage_i
+
+    @property
+    def attackRange(self):
+        return self.stats.attackRange
+
+    @property
+    def shieldRange(self):
+        return self.stats.shieldRange
+
+    @property
+    def max_health(self):
+        return self.stats.max_health
+
+    @property
+    def shieldPerUnit(self):
+        return self.stats.shieldPerUnit
+
+    @property
+    def cost(self):
+        return list(self.stats.cost)
 
     def upgrade(self):
-        from .game_state import UNIT_TYPE_TO_INDEX
-        type_config = self.config["unitInformation"][UNIT_TYPE_TO_INDEX[self.unit_type]].get("upgrade", {})
-        self.speed = type_config.get("speed", self.speed)
-        self.damage_f = type_config.get("attackDamageTower", self.damage_f)
-        self.damage_i = type_config.get("attackDamageWalker", self.damage_i)
-        self.attackRange = type_config.get("attackRange", self.attackRange)
-        self.shieldRange = type_config.get("shieldRange", self.shieldRange)
-        self.max_health = type_config.get("startHealth", self.max_health)
-        self.shieldPerUnit = type_config.get("shieldPerUnit", self.shieldPerUnit)
-        self.cost = [type_config.get("cost1", 0) + self.cost[0], type_config.get("cost2", 0) + self.cost[1]]
+        self.stats = self.stats.upgraded()
         self.upgraded = True
 
+    def __copy__(self):
+        unit = object.__new__(GameUnit)
+        unit.unit_type = self.unit_type
+        unit.player_index = self.player_index
+        unit.pending_removal = self.pending_removal
+        unit.upgraded = self.upgraded
+        unit.x = self.x
+        unit.y = self.y
+        unit.health = self.health
+        unit.stats = self.stats
+        return unit
 
     def __toString(self):
         owner = "Friendly" if self.player_index == 0 else "Enemy"
@@ -84,4 +199,3 @@ class GameUnit:
 
     def __repr__(self):
         return self.__toString()
-
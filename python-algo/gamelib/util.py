@@ -1,3 +1,5 @@
+import itertools
+import json
 import sys
 
 
@@ -21,6 +23,28 @@ def get_command():
         exit()
     return ret
 
+def read_turn_info(message):
+    """Reads the turnInfo list of a game engine message without decoding the rest of the message
+
+    Args:
+        message: A message string from the game engine
+
+    Returns:
+        The turnInfo list, [message type, turn number, action frame number], or None if the message has no turnInfo
+
+    """
+    start = message.find('"turnInfo"')
+    if start == -1:
+        return None
+    start = message.find("[", start)
+    end = message.find("]", start)
+    if start == -1 or end == -1:
+        return None
+    try:
+        return json.loads(message[start:end + 1])
+    except ValueError:
+        return None
+
 def send_command(cmd):
     """Sends your turn to standard output.
     Should usually only be called by 'GameState.submit_turn()'
@@ -29,6 +53,34 @@ def send_command(cmd):
     sys.stdout.write(cmd.strip() + "\n")
     sys.stdout.flush()
 
+def send_commands(*cmds):
+    """Sends several lines to standard output with a single write and flush.
+    Used by 'GameState.submit_turn()' to send the build and deploy lines together.
+
+    """
+    sys.stdout.write("".join(cmd.strip() + "\n" for cmd in cmds))
+    sys.stdout.flush()
+
+def serialize_commands(commands):
+    """Turns a build or deploy stack into the json line the game engine expects, without going through json.dumps.
+    Runs of the same (unit_type, x, y) command are serialized once and repeated, 
+    so queuing hundreds of the same unit costs about as much as queuing one.
+
+    Args:
+        commands: A list of (unit_type, x, y) tuples
+
+    Returns:
+        The stack as a json array of [unit_type, x, y] arrays
+
+    """
+    parts = []
+    for command, run in itertools.groupby(commands):
+        unit_type, x, y = command
+        entry = "[{},{},{}]".format(json.dumps(unit_type), int(x), int(y))
+        count = sum(1 for _ in run)
+        parts.append(entry if count == 1 else ",".join(itertools.repeat(entry, count)))
+    return "[" + ",".join(parts) + "]"
+
 def debug_write(*msg):
     """Prints a message to the games debug output
 